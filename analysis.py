@@ -0,0 +1,106 @@
+import sqlite3
+
+from codec import encode_move, decode_move
+from symmetry import symmetries
+
+# Entries kept by default before the least recently used ones are evicted
+ANALYSIS_CACHE_ENTRIES = 100000
+
+
+# Results of the computer moves kept on disk between runs in an SQLite database. A position is identified by the
+# board geometry with the starting squares, the key of its canonical form, which is the same in every run and for
+# the mirror images of the position, the walls left to both players and the evaluation. Every entry keeps the
+# completed depth, the evaluation, the best move and the principal variation after it of the canonical form, a
+# deeper search of the position replaces it. The entries used last are kept when the cache is over its size
+class AnalysisCache:
+    def __init__(self, path, max_entries=ANALYSIS_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS positions (geometry TEXT, position INTEGER, walls_left TEXT, "
+            "evaluation_mode TEXT, depth INTEGER, evaluation REAL, move INTEGER, principal_variation TEXT, "
+            "used INTEGER, PRIMARY KEY (geometry, position, walls_left, evaluation_mode))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS positions_used ON positions (used)")
+        self.connection.commit()
+
+        # Entries are stamped with an increasing use counter, the lowest ones are evicted first
+        self.entries, used = self.connection.execute("SELECT COUNT(*), MAX(used) FROM positions").fetchone()
+        self.used = used or 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    # Returns the key of the position and the symmetry that maps it to its canonical form
+    @staticmethod
+    def position_key(board):
+        geometry = f"{board.rows}x{board.columns}:" + ";".join(
+            f"{row},{column}" for row, column in (*board.player_1_start, *board.player_2_start))
+        key, symmetry = symmetries(board).canonical_key(board)
+        # SQLite integers are signed
+        position = key - (1 << 64) if key >= 1 << 63 else key
+        walls_left = ",".join(str(walls) for player in ('OX' if symmetry[1] else 'XO')
+                              for walls in board.walls_left[player])
+        return (geometry, position, walls_left, "path" if board.path_evaluation else "distance"), symmetry
+
+    # Returns the completed depth, the evaluation, the best move and the principal variation stored for the position
+    # if it was searched to at least the depth, otherwise None
+    def lookup(self, board, depth):
+        key, symmetry = self.position_key(board)
+        row = self.connection.execute(
+            "SELECT depth, evaluation, move, principal_variation FROM positions "
+            "WHERE geometry = ? AND position = ? AND walls_left = ? AND evaluation_mode = ?", key).fetchone()
+
+        if row is None or row[0] < depth:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.used += 1
+        self.connection.execute(
+            "UPDATE positions SET used = ? "
+            "WHERE geometry = ? AND position = ? AND walls_left = ? AND evaluation_mode = ?", (self.used, *key))
+        self.connection.commit()
+
+        # Swapping the sides negates the evaluation
+        stored_depth, evaluation, move, principal_variation = row
+        board_symmetries = symmetries(board)
+        return stored_depth, -evaluation if symmetry[1] else evaluation, \
+            board_symmetries.move(symmetry, decode_move(move)), \
+            tuple(board_symmetries.move(symmetry, decode_move(int(code))) for code in principal_variation.split(",")
+                  if code)
+
+    # Stores the search of the position unless it was searched deeper before, then evicts the least recently used
+    # entries over the size
+    def store(self, board, depth, evaluation, move, principal_variation):
+        key, symmetry = self.position_key(board)
+        row = self.connection.execute(
+            "SELECT depth FROM positions "
+            "WHERE geometry = ? AND position = ? AND walls_left = ? AND evaluation_mode = ?", key).fetchone()
+        if row is not None and row[0] > depth:
+            return
+
+        self.used += 1
+        board_symmetries = symmetries(board)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (*key, depth, -evaluation if symmetry[1] else evaluation,
+             encode_move(board_symmetries.move(symmetry, move)),
+             ",".join(str(encode_move(board_symmetries.move(symmetry, reply))) for reply in principal_variation),
+             self.used))
+        self.stores += 1
+
+        if row is None:
+            self.entries += 1
+            if self.entries > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM positions WHERE rowid IN (SELECT rowid FROM positions ORDER BY used LIMIT ?)",
+                    (self.entries - self.max_entries,))
+                self.entries = self.max_entries
+        self.connection.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores, "entries": self.entries}
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+from copy import deepcopy
+from math import inf
+from timeit import default_timer
+
+from main import *
+from blocking import BlockingWalls
+from codec import encode_position, decode_position
+from instrumentation import SearchStats
+from race import is_race, race_solvers, race_solver
+from search import legal_board_moves, minimax, SearchContext, SearchOptions
+from transposition import transposition_table
+
+# Geometry of the positions in the corpus, it doesn't depend on the config so results stay comparable
+ROWS, COLUMNS = 11, 14
+PLAYER_1_START = [[3, 3], [7, 3]]
+PLAYER_2_START = [[3, 10], [7, 10]]
+
+# Positions as the placed walls, the pawns of both players, the walls left as (vertical, horizontal) to both players,
+# the perft depth, the search depth and the deeper search depth of the scaling benchmark. It's always the first
+# player's turn
+CORPUS = {
+    "opening": {
+        "walls": [],
+        "player_1_pawns": [[3, 3], [7, 3]],
+        "player_2_pawns": [[3, 10], [7, 10]],
+        "walls_left": ((9, 9), (9, 9)),
+        "perft_depth": 1,
+        "search_depth": 4,
+        "scaling_depth": 4,
+    },
+    "midgame": {
+        "walls": [('Z', 3, 5), ('P', 5, 6), ('Z', 6, 8), ('P', 2, 10), ('Z', 4, 1), ('P', 7, 4), ('Z', 1, 7),
+                  ('P', 8, 9), ('Z', 5, 11), ('P', 4, 6)],
+        "player_1_pawns": [[3, 6], [7, 5]],
+        "player_2_pawns": [[4, 8], [6, 9]],
+        "walls_left": ((4, 4), (4, 4)),
+        "perft_depth": 1,
+        "search_depth": 3,
+        "scaling_depth": 4,
+    },
+    "race": {
+        "walls": [('Z', 3, 5), ('P', 5, 6), ('Z', 6, 8), ('P', 2, 10), ('Z', 4, 1), ('P', 7, 4), ('Z', 1, 7),
+                  ('P', 8, 9), ('Z', 5, 11), ('P', 4, 6), ('Z', 2, 3), ('P', 6, 1)],
+        "player_1_pawns": [[5, 4], [6, 3]],
+        "player_2_pawns": [[5, 9], [6, 10]],
+        "walls_left": ((0, 0), (0, 0)),
+        "perft_depth": 4,
+        "search_depth": 5,
+        "scaling_depth": 7,
+    },
+}
+
+# Position with a pawn of each player on the starting square of its other pawn, whose decoding must not lose it
+CODEC_POSITION = {
+    "walls": [('Z', 6, 2), ('P', 2, 9)],
+    "player_1_pawns": [[7, 3], [6, 2]],
+    "player_2_pawns": [[4, 9], [3, 10]],
+    "walls_left": ((8, 9), (9, 8)),
+}
+
+# Times are the best of this many runs
+REPEATS = 3
+# Number of legal moves played on copies of the board and with make and unmake
+PLAYED_MOVES = 200
+
+# Results that must be equal to the baseline and results where lower and higher values are better
+COUNTS = ("moves", "perft", "search_nodes", "codec_mismatches")
+TIMES = ("perft_seconds", "search_seconds", "copy_us", "make_unmake_us", "path_check_us", "blocking_walls_us",
+         "race_seconds")
+RATES = ("nodes_per_second", "speedup")
+
+# Numbers of processes of the scaling benchmark of the parallel search
+SCALING_PROCESSES = (1, 2, 4, 8, 16)
+
+
+# Size of the transposition table of the searches
+TABLE_SIZE_MB = 32
+
+
+# Sets up the board of the position
+def load_position(board_class, position):
+    board = board_class(ROWS, COLUMNS, PLAYER_1_START, PLAYER_2_START)
+    for wall in position["walls"]:
+        board.place_wall(*wall)
+    board.set_pawns(position["player_1_pawns"], position["player_2_pawns"])
+    board.walls_left = {'X': list(position["walls_left"][0]), 'O': list(position["walls_left"][1])}
+
+    return board
+
+
+# Counts the positions at the depth
+def perft(board, depth):
+    if depth == 0 or board.game_end():
+        return 1
+
+    nodes = 0
+    for move in legal_board_moves(board):
+        board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move()
+
+    return nodes
+
+
+# Pawns, starting squares and empty squares of the board as printed
+def occupancy(board):
+    return [[board.square_center(row, column) for column in range(board.columns)] for row in range(board.rows)]
+
+
+# Returns the number of backends the position decodes into a different position for. The decoded boards must have
+# the same squares, walls, hash and legal moves as the board and their pawns must be on the squares of the pawns
+def codec_mismatches(board):
+    pawns = {'X': set(map(tuple, board.player_1_pawns)), 'O': set(map(tuple, board.player_2_pawns))}
+    mismatches = 0
+
+    for board_class in BOARD_BACKENDS.values():
+        decoded = decode_position(encode_position(board), board_class)
+        squares = occupancy(decoded)
+        if squares != occupancy(board) or decoded.hash_key != board.hash_key or \
+                sorted(decoded.placed_walls()) != sorted(board.placed_walls()) or \
+                legal_board_moves(decoded) != legal_board_moves(board) or \
+                any({(row, column) for row in range(board.rows) for column in range(board.columns)
+                     if squares[row][column] == player} != pawns[player] for player in 'XO'):
+            mismatches += 1
+
+    return mismatches
+
+
+# Returns the best time of the function over the repeats and its last result
+def best_time(function, repeats=REPEATS):
+    best, result = inf, None
+    for _ in range(repeats):
+        start = default_timer()
+        result = function()
+        best = min(best, default_timer() - start)
+
+    return best, result
+
+
+def benchmark_position(board_class, position, options=None):
+    board = load_position(board_class, position)
+    results = {}
+
+    # Move generation
+    moves = legal_board_moves(board)
+    results["moves"] = len(moves)
+    results["perft_seconds"], results["perft"] = best_time(lambda: perft(board, position["perft_depth"]))
+
+    # Playing moves by copying the board like the game loop and the search used to and by making and unmaking them
+    played_moves = moves[:PLAYED_MOVES]
+    if played_moves:
+        def copy_and_play():
+            for move in played_moves:
+                deepcopy(board).make_move(move)
+
+        def make_and_unmake():
+            for move in played_moves:
+                board.make_move(move)
+                board.unmake_move()
+
+        results["copy_us"] = best_time(copy_and_play)[0] / len(played_moves) * 1e6
+        results["make_unmake_us"] = best_time(make_and_unmake)[0] / len(played_moves) * 1e6
+
+    # Path checks and the blocking walls of all wall slots
+    results["path_check_us"] = best_time(lambda: [board.pawns_reach_goals() for _ in range(100)])[0] / 100 * 1e6
+
+    def blocking_walls():
+        walls = BlockingWalls(board)
+        for row in range(board.rows - 1):
+            for column in range(board.columns - 1):
+                for wall_type in 'ZP':
+                    if board.valid_wall_placement(wall_type, row, column, print_failure=False):
+                        walls.is_blocking((wall_type, row, column))
+
+    results["blocking_walls_us"] = best_time(blocking_walls)[0] * 1e6
+
+    # Encoding the position and the positions after the played moves and decoding them into both backends
+    results["codec_mismatches"] = codec_mismatches(board)
+    for move in played_moves:
+        board.make_move(move)
+        results["codec_mismatches"] += codec_mismatches(board)
+        board.unmake_move()
+
+    # Fixed depth search, every repeat starts with an empty transposition table. The nodes are counted by one more
+    # search with stats, which would slow down the timed ones
+    table = transposition_table(TABLE_SIZE_MB)
+
+    def search(stats=None):
+        table.clear()
+        minimax(board, position["search_depth"], -inf, inf, SearchContext(table, stats=stats, options=options))
+
+    results["search_seconds"] = best_time(search)[0]
+    stats = SearchStats()
+    search(stats)
+    results["search_nodes"] = stats.counters["nodes"]
+    results["nodes_per_second"] = results["search_nodes"] / results["search_seconds"]
+
+    # Solving a race with the tables of its walls built from scratch
+    if is_race(board):
+        def solve_race():
+            race_solvers.clear()
+            return race_solver(board).solve(board)
+
+        results["race_seconds"] = best_time(solve_race)[0]
+
+    return results
+
+
+def run_benchmarks(options=None):
+    results = {}
+    for name, position in CORPUS.items():
+        for backend, board_class in BOARD_BACKENDS.items():
+            results[f"{name}/{backend}"] = benchmark_position(board_class, position, options)
+            print(f"{name}/{backend}: " + ", ".join(
+                f"{key} {value:.4g}" if isinstance(value, float) else f"{key} {value}"
+                for key, value in results[f"{name}/{backend}"].items()))
+
+    for backend, board_class in BOARD_BACKENDS.items():
+        results[f"codec/{backend}"] = {"codec_mismatches": codec_mismatches(load_position(board_class, CODEC_POSITION))}
+        print(f"codec/{backend}: codec_mismatches {results[f'codec/{backend}']['codec_mismatches']}")
+
+    return results
+
+
+# Times the parallel search of every position to its scaling depth with the numbers of processes. Every repeat starts
+# with an empty shared table, the speedup is relative to the first number of processes
+def benchmark_scaling(process_counts):
+    results = {}
+    for name, position in CORPUS.items():
+        board = load_position(BitBoard, position)
+        player = Computer('X', Game())
+        player.table_size_mb = TABLE_SIZE_MB
+        player.parallel = "smp"
+        player.search_depth = position["scaling_depth"]
+        moves = legal_board_moves(board)
+        base_seconds = None
+
+        for processes in process_counts:
+            engine = player.game.engine = Engine(processes)
+
+            def search():
+                if engine.table is not None:
+                    engine.table.clear()
+                return player.search_shared_tree(board, moves, None)
+
+            try:
+                seconds, (depth, _, best_move, _) = best_time(search)
+            finally:
+                engine.shutdown()
+
+            base_seconds = base_seconds or seconds
+            results[f"scaling/{name}/{processes}"] = {"search_seconds": seconds, "speedup": base_seconds / seconds}
+            print(f"scaling/{name}/{processes}: depth {depth}, search_seconds {seconds:.4g}, "
+                  f"speedup {base_seconds / seconds:.3g}, best move {best_move}")
+
+    return results
+
+
+# Prints every result that differs from the baseline by more than the tolerance and returns their number. Counts
+# have to be equal, times may only be slower and rates only lower by the tolerance
+def compare_results(results, baseline, tolerance):
+    regressions = 0
+
+    for benchmark, values in results.items():
+        for key, value in values.items():
+            if key not in baseline.get(benchmark, {}):
+                continue
+
+            base = baseline[benchmark][key]
+            if key in COUNTS:
+                regressed = value != base
+            elif key in TIMES:
+                regressed = value > base * (1 + tolerance)
+            elif key in RATES:
+                regressed = value < base / (1 + tolerance)
+            else:
+                continue
+
+            if regressed:
+                regressions += 1
+                print(f"REGRESSION {benchmark} {key}: {base:.6g} -> {value:.6g}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks move generation, path checks and search")
+    parser.add_argument("--output", help="File the results are written to as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Fraction by which times and rates may be worse than the baseline")
+    parser.add_argument("--scaling", action="store_true",
+                        help="Also time the parallel search with the numbers of processes")
+    parser.add_argument("--processes", type=int, nargs="+", default=SCALING_PROCESSES,
+                        help="Numbers of processes of the scaling benchmark")
+    parser.add_argument("--search", choices=("alphabeta", "pvs"), default="alphabeta",
+                        help="Search algorithm of the fixed depth searches")
+    arguments = parser.parse_args()
+
+    benchmark_results = run_benchmarks(SearchOptions(algorithm=arguments.search))
+    if arguments.scaling:
+        benchmark_results.update(benchmark_scaling(arguments.processes))
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(benchmark_results, output_file, indent=2, sort_keys=True)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            if compare_results(benchmark_results, json.load(baseline_file), arguments.tolerance):
+                sys.exit(1)
+        print("No regressions")
@@ -0,0 +1,339 @@
+from math import inf
+
+from board import Board
+
+# Static evaluation tables shared by all boards with the same geometry and starting squares
+evaluation_tables = {}
+
+
+# Board backend that keeps the whole position in integer bitmasks instead of a grid of BoardSquare objects.
+# Bit (row * columns + column) of every mask corresponds to the square (row, column).
+# Wall segments are stored per square: right_walls has the bit of a square set if there is a wall on its right
+# and bottom_walls if there is a wall on its bottom, so the left and top walls of a square are the right and bottom
+# walls of its neighbours
+class BitBoard(Board):
+    def init_squares(self):
+        rows, columns = self.rows, self.columns
+
+        # Geometry masks
+        self.full = (1 << rows * columns) - 1
+        first_column = sum(1 << row * columns for row in range(rows))
+        self.not_first_column = self.full & ~first_column
+        self.not_last_column = self.full & ~(first_column << columns - 1)
+
+        # Pawn and starting square masks
+        self.player_1_occupied = self.square_bit(*self.player_1_pawns[0]) | self.square_bit(*self.player_1_pawns[1])
+        self.player_2_occupied = self.square_bit(*self.player_2_pawns[0]) | self.square_bit(*self.player_2_pawns[1])
+        self.player_1_start_mask = self.player_1_occupied
+        self.player_2_start_mask = self.player_2_occupied
+
+        # Wall segment masks
+        self.right_walls = 0
+        self.bottom_walls = 0
+
+        # Diagonal jumps pass through the corner shared by four squares. The bit of the top-left square of the four
+        # is set in the first mask if the main diagonal through that corner is blocked and in the second mask if the
+        # anti-diagonal is. They are recomputed lazily since most placed walls are lifted before any jump is made
+        self.diagonal_blocks = (0, 0)
+
+        self.evaluation_tables = self.evaluation_table()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['evaluation_tables']
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.evaluation_tables = self.evaluation_table()
+
+    # Returns the per-square static evaluation contribution of the pawns of both players, which is the sum of
+    # the inverse distances to the opponent's starting squares or inf if the pawn is on one of them
+    def evaluation_table(self):
+        key = (self.rows, self.columns, *map(tuple, self.player_1_start), *map(tuple, self.player_2_start))
+
+        if key not in evaluation_tables:
+            tables = ([], [])
+            for row in range(self.rows):
+                for column in range(self.columns):
+                    for table, goals in zip(tables, (self.player_2_start, self.player_1_start)):
+                        pawn_distance_1 = self.non_diagonal_distance((row, column), goals[0])
+                        pawn_distance_2 = self.non_diagonal_distance((row, column), goals[1])
+                        table.append(inf if pawn_distance_1 == 0 or pawn_distance_2 == 0 else
+                                     1 / pawn_distance_1 + 1 / pawn_distance_2)
+            evaluation_tables[key] = tables
+
+        return evaluation_tables[key]
+
+    def square_bit(self, row, column):
+        return 1 << row * self.columns + column
+
+    def square_center(self, row, column):
+        bit = self.square_bit(row, column)
+
+        # Pawns only share a square when one reaches the opponent's occupied starting square
+        if self.player_1_occupied & self.player_2_occupied & bit:
+            return 'X' if self.player_2_start_mask & bit else 'O'
+        if self.player_1_occupied & bit:
+            return 'X'
+        if self.player_2_occupied & bit:
+            return 'O'
+        return '·' if (self.player_1_start_mask | self.player_2_start_mask) & bit else ' '
+
+    def right_wall(self, row, column):
+        return bool(self.right_walls & self.square_bit(row, column))
+
+    def bottom_wall(self, row, column):
+        return bool(self.bottom_walls & self.square_bit(row, column))
+
+    # Same walls as Board.placed_walls found from the set bits of the wall masks. A segment starts a wall unless the
+    # segment before it in its column or row does
+    def placed_walls(self):
+        walls = []
+
+        for wall_type, segments, previous in (('Z', self.right_walls, self.columns), ('P', self.bottom_walls, 1)):
+            starts = 0
+            while segments:
+                bit = segments & -segments
+                segments ^= bit
+                if not starts & bit >> previous:
+                    starts |= bit
+                    index = bit.bit_length() - 1
+                    walls.append((wall_type, index // self.columns, index % self.columns))
+
+        return walls
+
+    def game_end(self):
+        return bool(self.player_1_occupied & self.player_2_start_mask or
+                    self.player_2_occupied & self.player_1_start_mask)
+
+    def valid_pawn_move(self, player, pawn_index, row, column, print_failure=True):
+        # Check if pawn indices are in range
+        if row >= self.rows or column >= self.columns:
+            self.conditional_print("Pawn indices are out of bounds!", print_failure)
+            return False
+
+        prev_pos = self.player_1_pawns[pawn_index] if player == 'X' else self.player_2_pawns[pawn_index]
+        distance = self.non_diagonal_distance(prev_pos, (row, column))
+
+        if distance == 0 or distance > 2:
+            self.conditional_print("You cannot stay in place or move more than two squares from you current position!",
+                                   print_failure)
+            return False
+
+        bit = self.square_bit(row, column)
+        opponent_start = self.player_2_start_mask if player == 'X' else self.player_1_start_mask
+        if (self.player_1_occupied | self.player_2_occupied) & bit and not opponent_start & bit:
+            self.conditional_print("You cannot jump to a square with a pawn!", print_failure)
+            return False
+
+        if (row, column) in self.iter_legal_jumps(player, prev_pos[0], prev_pos[1]):
+            return True
+
+        # Only a one square jump forward can fail for a reason other than a wall
+        if distance == 1 and (row, column) in self.iter_non_blocking_jumps(prev_pos[0], prev_pos[1]):
+            self.conditional_print("You cannot jump just one space forward!", print_failure)
+        else:
+            self.conditional_print("You cannot jump over a wall!", print_failure)
+        return False
+
+    def move_pawn(self, player, pawn_index, row, column):
+        player_pawns = self.player_1_pawns if player == 'X' else self.player_2_pawns
+        old_row, old_column = player_pawns[pawn_index][0], player_pawns[pawn_index][1]
+        old_index, index = old_row * self.columns + old_column, row * self.columns + column
+
+        # Update pawn position
+        player_pawns[pawn_index][0], player_pawns[pawn_index][1] = row, column
+
+        # Update occupancy
+        if player == 'X':
+            self.player_1_occupied = self.player_1_occupied & ~(1 << old_index) | 1 << index
+        else:
+            self.player_2_occupied = self.player_2_occupied & ~(1 << old_index) | 1 << index
+        self.evaluation = None
+
+        # Update hash
+        zobrist = self.zobrist
+        pawn_keys = zobrist.pawns[player][pawn_index]
+        self.hash_key ^= pawn_keys[old_index] ^ pawn_keys[index] ^ zobrist.side
+
+        # Return the undoing move
+        return player, pawn_index, old_row, old_column
+
+    def set_pawns(self, player_1_pawns, player_2_pawns):
+        self.replace_pawns(player_1_pawns, player_2_pawns)
+        self.player_1_occupied = self.square_bit(*player_1_pawns[0]) | self.square_bit(*player_1_pawns[1])
+        self.player_2_occupied = self.square_bit(*player_2_pawns[0]) | self.square_bit(*player_2_pawns[1])
+
+    def valid_wall_placement(self, wall_type, row, column, print_failure=True):
+        # Check if wall indices are in range
+        if row >= self.rows - 1 or column >= self.columns - 1:
+            self.conditional_print("Wall indices out of bound!", print_failure)
+            return False
+
+        index = row * self.columns + column
+        if (wall_type == 'Z' and (self.right_walls >> index & 1 or self.right_walls >> index + self.columns & 1)) or \
+                (wall_type == 'P' and self.bottom_walls >> index & 3):
+            self.conditional_print("A wall already exists on those coordinates!", print_failure)
+            return False
+
+        return True
+
+    def place_wall(self, wall_type, row, column, lift=False, player=None):
+        index = row * self.columns + column
+
+        if wall_type == 'Z':
+            segments = 1 << index | 1 << index + self.columns
+            self.right_walls = self.right_walls & ~segments if lift else self.right_walls | segments
+        else:
+            segments = 3 << index
+            self.bottom_walls = self.bottom_walls & ~segments if lift else self.bottom_walls | segments
+
+        for slot in self.wall_slots.overlaps[wall_type][row][column]:
+            self.overlapping_walls[slot] += -1 if lift else 1
+
+        self.diagonal_blocks = None
+        self.num_placed_walls += -1 if lift else 1
+        self.evaluation = None
+
+        if self.distance_fields is not None:
+            wall = wall_type, row, column
+            if wall in self.pending_walls:
+                self.pending_walls.remove(wall)
+            else:
+                self.pending_walls.add(wall)
+
+        # Update hash
+        self.hash_key ^= self.zobrist.walls[player][wall_type][index]
+
+    # A diagonal is blocked if two wall segments meeting in its corner separate the two squares, which happens when
+    # the segments are collinear or form an L around one of the two squares
+    def update_diagonal_blocks(self):
+        right_walls, bottom_walls = self.right_walls, self.bottom_walls
+
+        straight = bottom_walls & bottom_walls >> 1 | right_walls & right_walls >> self.columns
+        self.diagonal_blocks = (
+            straight | bottom_walls & right_walls | bottom_walls >> 1 & right_walls >> self.columns,
+            straight | bottom_walls >> 1 & right_walls | bottom_walls & right_walls >> self.columns
+        )
+
+        return self.diagonal_blocks
+
+    # Flood fill from the source until the destination is reached
+    def check_path(self, source, destination):
+        target = self.square_bit(*destination)
+        reached = frontier = self.square_bit(*source)
+
+        while frontier and not reached & target:
+            frontier = self.expand_squares(frontier) & ~reached
+            reached |= frontier
+
+        return bool(reached & target)
+
+    def reaches_all(self, source, targets):
+        target = 0
+        for square in targets:
+            target |= self.square_bit(*square)
+        reached = frontier = self.square_bit(*source)
+
+        while frontier and reached & target != target:
+            frontier = self.expand_squares(frontier) & ~reached
+            reached |= frontier
+
+        return reached & target == target
+
+    def region_mask(self, row, column):
+        reached = frontier = self.square_bit(row, column)
+
+        while frontier:
+            frontier = self.expand_squares(frontier) & ~reached
+            reached |= frontier
+
+        return reached
+
+    # Returns the mask of all squares reachable with a single non-blocking jump from any of the squares in the mask
+    def expand_squares(self, squares):
+        columns = self.columns
+        right_walls, bottom_walls = self.right_walls, self.bottom_walls
+        main_diagonal_blocked, anti_diagonal_blocked = self.diagonal_blocks or self.update_diagonal_blocks()
+        left_side = squares & self.not_first_column
+        right_side = squares & self.not_last_column
+
+        return (
+            # Top and bottom
+            squares >> columns & ~bottom_walls |
+            (squares & ~bottom_walls) << columns |
+            # Left and right
+            left_side >> 1 & ~right_walls |
+            (right_side & ~right_walls) << 1 |
+            # Top-Left and Bottom-Right
+            left_side >> columns + 1 & ~main_diagonal_blocked |
+            (right_side & ~main_diagonal_blocked) << columns + 1 |
+            # Top-Right and Bottom-Left
+            (right_side >> columns & ~anti_diagonal_blocked) << 1 |
+            (left_side >> 1 & ~anti_diagonal_blocked) << columns
+        ) & self.full
+
+    # Wall and diagonal masks in the order the jump tables refer to them
+    def wall_masks(self):
+        return self.right_walls, self.bottom_walls, *(self.diagonal_blocks or self.update_diagonal_blocks())
+
+    def jump_indices(self, index):
+        walls = self.wall_masks()
+        return [bit.bit_length() - 1
+                for _, _, bit, wall_mask, _, _, wall_bit in self.jump_tables.non_blocking_jumps[index]
+                if not walls[wall_mask] & wall_bit]
+
+    def iter_non_blocking_jumps(self, row, column):
+        walls = self.wall_masks()
+        for target_row, target_column, _, wall_mask, _, _, wall_bit in \
+                self.jump_tables.non_blocking_jumps[row * self.columns + column]:
+            if not walls[wall_mask] & wall_bit:
+                yield target_row, target_column
+
+    def iter_legal_jumps(self, player, row, column):
+        walls = self.wall_masks()
+        occupied = self.player_1_occupied | self.player_2_occupied
+        opponent_start = self.player_2_start_mask if player == 'X' else self.player_1_start_mask
+        # Pawns can land on empty squares and on the opponent's starting squares
+        blocked = occupied & ~opponent_start
+
+        for diagonal, target_row, target_column, target, wall_mask, _, _, wall_bit, \
+                far_row, far_column, far, _, _, far_wall_bit in \
+                self.jump_tables.legal_jumps[row * self.columns + column]:
+            if walls[wall_mask] & wall_bit:
+                continue
+
+            if diagonal:
+                if not blocked & target:
+                    yield target_row, target_column
+                continue
+
+            far_open = far and not walls[wall_mask] & far_wall_bit
+
+            # Short jump, only onto the opponent's starting squares or up to a pawn
+            if opponent_start & target or (not occupied & target and far_open and occupied & far):
+                yield target_row, target_column
+
+            # Long jump
+            if far_open and not blocked & far:
+                yield far_row, far_column
+
+    def pawn_evaluation(self):
+        player_1_table, player_2_table = self.evaluation_tables
+        columns = self.columns
+        pawn_1, pawn_2 = self.player_1_pawns
+        evaluation_1 = player_1_table[pawn_1[0] * columns + pawn_1[1]]
+        evaluation_2 = player_1_table[pawn_2[0] * columns + pawn_2[1]]
+
+        if evaluation_1 == inf or evaluation_2 == inf:
+            return inf
+
+        pawn_3, pawn_4 = self.player_2_pawns
+        evaluation_3 = player_2_table[pawn_3[0] * columns + pawn_3[1]]
+        evaluation_4 = player_2_table[pawn_4[0] * columns + pawn_4[1]]
+
+        if evaluation_3 == inf or evaluation_4 == inf:
+            return -inf
+
+        return evaluation_1 + evaluation_2 - evaluation_3 - evaluation_4
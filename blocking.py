@@ -0,0 +1,97 @@
+# Finds the wall slots that would cut a pawn off from one of its goals.
+# Walls and the border of the board are barriers between the corner points of the squares, and the squares a pawn
+# can reach are the regions the barriers enclose. A new wall can only split a region if it connects corner points
+# that are already connected by barriers, which closes a loop. Any wall with at most one of its three corner points
+# on an existing barrier is never blocking. For the walls that close a loop the regions around the wall are
+# flooded once per position, after which checking the pawns of any pawn move against them takes constant time
+class BlockingWalls:
+    def __init__(self, board):
+        self.board = board
+        self.lattice_columns = board.columns + 1
+
+        # Union-find over the corner points, all points on the border share the last node
+        self.border = (board.rows + 1) * self.lattice_columns
+        self.parents = list(range(self.border + 1))
+        for wall_type, row, column in board.placed_walls():
+            first, middle, last = self.wall_points(wall_type, row, column)
+            self.union(first, middle)
+            self.union(middle, last)
+
+        # Regions around every checked wall, there are none if the wall doesn't close a loop
+        self.split_regions = {}
+
+    # Corner points at the start, middle and end of the wall
+    def wall_points(self, wall_type, row, column):
+        if wall_type == 'Z':
+            points = ((row, column + 1), (row + 1, column + 1), (row + 2, column + 1))
+        else:
+            points = ((row + 1, column), (row + 1, column + 1), (row + 1, column + 2))
+
+        return tuple(self.border if point_row in (0, self.board.rows) or point_column in (0, self.board.columns)
+                     else point_row * self.lattice_columns + point_column
+                     for point_row, point_column in points)
+
+    def find(self, point):
+        parents = self.parents
+        while parents[point] != point:
+            parents[point] = parents[parents[point]]
+            point = parents[point]
+
+        return point
+
+    def union(self, point_1, point_2):
+        self.parents[self.find(point_1)] = self.find(point_2)
+
+    # Checks if the wall would close a loop of barriers and split the region it is in
+    def splits_region(self, wall_type, row, column):
+        first, middle, last = map(self.find, self.wall_points(wall_type, row, column))
+        return first == middle or middle == last or first == last
+
+    # Returns the masks of the regions next to the wall once it's placed, every part of the split region is next
+    # to the wall
+    def regions(self, wall_type, row, column):
+        board = self.board
+        if wall_type == 'Z':
+            squares = ((row, column), (row + 1, column), (row, column + 1), (row + 1, column + 1))
+        else:
+            squares = ((row, column), (row, column + 1), (row + 1, column), (row + 1, column + 1))
+
+        board.place_wall(wall_type, row, column)
+        regions = []
+        for square_row, square_column in squares:
+            if not any(region >> square_row * board.columns + square_column & 1 for region in regions):
+                regions.append(board.region_mask(square_row, square_column))
+        board.place_wall(wall_type, row, column, lift=True)
+
+        return regions
+
+    # Checks if the wall would separate any pawn on the board from one of the starting squares of the opponent. With
+    # a pawn move the pawn is checked on the square it moves to, without moving it on the board
+    def is_blocking(self, wall, pawn_move=None):
+        regions = self.split_regions.get(wall)
+        if regions is None:
+            regions = self.split_regions[wall] = self.regions(*wall) if self.splits_region(*wall) else ()
+        if not regions:
+            return False
+
+        board = self.board
+        columns = board.columns
+        player_1_pawns, player_2_pawns = board.player_1_pawns, board.player_2_pawns
+        if pawn_move is not None:
+            player, pawn_index, row, column = pawn_move
+            pawns = [*(player_1_pawns if player == 'X' else player_2_pawns)]
+            pawns[pawn_index] = (row, column)
+            if player == 'X':
+                player_1_pawns = pawns
+            else:
+                player_2_pawns = pawns
+
+        for region in regions:
+            for pawns, goals in ((player_1_pawns, board.player_2_start), (player_2_pawns, board.player_1_start)):
+                goals_inside = [region >> goal[0] * columns + goal[1] & 1 for goal in goals]
+                for pawn in pawns:
+                    pawn_inside = region >> pawn[0] * columns + pawn[1] & 1
+                    if pawn_inside != goals_inside[0] or pawn_inside != goals_inside[1]:
+                        return True
+
+        return False
@@ -1,23 +1,75 @@
 import heapq
+from collections import deque
 from copy import deepcopy, copy
 from math import inf
 
+from geometry import jump_tables, wall_slots, RIGHT_WALLS, BOTTOM_WALLS, MAIN_DIAGONAL_BLOCKS
+from zobrist import zobrist_keys
+
 
 class Board:
-    def __init__(self, rows, columns, player_1_pawns, player_2_pawns):
+    def __init__(self, rows, columns, player_1_pawns, player_2_pawns, walls=0):
         self.rows = rows
         self.columns = columns
         self.num_placed_walls = 0
+        # Player to move and the vertical and horizontal walls left to each player, updated by make_move
+        self.side_to_move = 'X'
+        self.walls_left = {'X': [walls, walls], 'O': [walls, walls]}
         self.player_1_pawns = deepcopy(player_1_pawns)
         self.player_2_pawns = deepcopy(player_2_pawns)
         self.player_1_start = (copy(player_1_pawns[0]), copy(player_1_pawns[1]))
         self.player_2_start = (copy(player_2_pawns[0]), copy(player_2_pawns[1]))
 
-        self.board = [[BoardSquare() for _ in range(columns)] for _ in range(rows)]
-        self.board[player_1_pawns[0][0]][player_1_pawns[0][1]].set_start('X')
-        self.board[player_1_pawns[1][0]][player_1_pawns[1][1]].set_start('X')
-        self.board[player_2_pawns[0][0]][player_2_pawns[0][1]].set_start('O')
-        self.board[player_2_pawns[1][0]][player_2_pawns[1][1]].set_start('O')
+        self.init_squares()
+
+        # Static evaluation of the position, None until it's computed after a pawn moves
+        self.evaluation = None
+        # Entries for undoing the moves played by make_move
+        self.undo_stack = []
+
+        # Evaluate with the path lengths to the goals instead of the distances that ignore walls
+        self.path_evaluation = False
+        # Distances from every square to each of the four goals, set up when the path evaluation first needs them.
+        # Walls placed or lifted since the last update are pending
+        self.distance_fields = None
+        self.pending_walls = set()
+
+        # Jumps from every square with the walls that block them, shared by all boards of the same size
+        self.jump_tables = jump_tables(rows, columns)
+        # Number of placed walls of the same type overlapping every wall slot, a wall can be placed in the slots
+        # without any
+        self.wall_slots = wall_slots(rows, columns)
+        self.overlapping_walls = bytearray(self.wall_slots.count)
+
+        self.init_hash()
+
+    # Sets up the squares with the pawns on their starting squares, the backends keep them in their own structures
+    def init_squares(self):
+        self.board = [[BoardSquare() for _ in range(self.columns)] for _ in range(self.rows)]
+        for player, pawns in (('X', self.player_1_pawns), ('O', self.player_2_pawns)):
+            for row, column in pawns:
+                self.board[row][column].set_start(player)
+
+    # Sets up the Zobrist hash of the position which is updated incrementally by move_pawn and place_wall
+    def init_hash(self):
+        self.zobrist = zobrist_keys(self.rows, self.columns)
+        self.hash_key = self.zobrist.initial_hash(self.columns, self.player_1_pawns, self.player_2_pawns)
+
+    # Shared tables aren't pickled, they are fetched from the cache when unpickling. Copies are made to play moves
+    # of their own, so a copy of the board starts without any moves to undo
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['zobrist']
+        del state['jump_tables']
+        del state['wall_slots']
+        state['undo_stack'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.zobrist = zobrist_keys(self.rows, self.columns)
+        self.jump_tables = jump_tables(self.rows, self.columns)
+        self.wall_slots = wall_slots(self.rows, self.columns)
 
     def print_board(self):
         for i in range(2 * self.rows + 3):
@@ -49,22 +101,32 @@ class Board:
 
                     # Squares
                     elif j % 2 == 0:
-                        print(self.board[index_i][index_j].center, end="")
+                        print(self.square_center(index_i, index_j), end="")
 
                     # Left-right walls
                     else:
-                        print("‖" if self.board[index_i][index_j].right else "|", end="")
+                        print("‖" if self.right_wall(index_i, index_j) else "|", end="")
 
                 # Top-bottom wall rows
 
                 # Top-bottom walls
                 elif j != 0 and j != 2 * self.columns + 2 and j % 2 == 0:
-                    print("=" if self.board[index_i][index_j].bottom else "—", end="")
+                    print("=" if self.bottom_wall(index_i, index_j) else "—", end="")
 
                 else:
                     print(" ", end="")
             print()
 
+    # Returns the character printed in the center of the square
+    def square_center(self, row, column):
+        return self.board[row][column].center
+
+    def right_wall(self, row, column):
+        return self.board[row][column].right
+
+    def bottom_wall(self, row, column):
+        return self.board[row][column].bottom
+
     def game_end(self):
         return self.player_1_pawns[0] in self.player_2_start or self.player_1_pawns[1] in self.player_2_start or \
                self.player_2_pawns[0] in self.player_1_start or self.player_2_pawns[1] in self.player_1_start
@@ -223,10 +285,38 @@ class Board:
         self.board[old_row][old_column].center = \
             ' ' if self.board[old_row][old_column].starting is None else '·'
         self.board[row][column].center = player
+        self.evaluation = None
+
+        # Update hash
+        pawn_keys = self.zobrist.pawns[player][pawn_index]
+        self.hash_key ^= pawn_keys[old_row * self.columns + old_column] ^ pawn_keys[row * self.columns + column] ^ \
+            self.zobrist.side
 
         # Return the undoing move
         return player, pawn_index, old_row, old_column
 
+    # Puts the pawns of both players on the squares at once. Moving them one at a time from the starting squares
+    # would lose a pawn that ends on the starting square of the other pawn of its player
+    def set_pawns(self, player_1_pawns, player_2_pawns):
+        for row, column in (*self.player_1_pawns, *self.player_2_pawns):
+            self.board[row][column].center = ' ' if self.board[row][column].starting is None else '·'
+
+        self.replace_pawns(player_1_pawns, player_2_pawns)
+        for player, pawns in (('X', self.player_1_pawns), ('O', self.player_2_pawns)):
+            for row, column in pawns:
+                self.board[row][column].center = player
+
+    # Updates the pawn squares and the hash for set_pawns, the backends update the squares of the board
+    def replace_pawns(self, player_1_pawns, player_2_pawns):
+        for player, pawns, new_pawns in (('X', self.player_1_pawns, player_1_pawns),
+                                         ('O', self.player_2_pawns, player_2_pawns)):
+            for pawn_index, (row, column) in enumerate(new_pawns):
+                pawn_keys = self.zobrist.pawns[player][pawn_index]
+                self.hash_key ^= pawn_keys[pawns[pawn_index][0] * self.columns + pawns[pawn_index][1]] ^ \
+                    pawn_keys[row * self.columns + column]
+                pawns[pawn_index][0], pawns[pawn_index][1] = row, column
+        self.evaluation = None
+
     def valid_wall_placement(self, wall_type, row, column, print_failure=True):
         # Check if wall indices are in range
         if row >= self.rows - 1 or column >= self.columns - 1:
@@ -240,7 +330,8 @@ class Board:
 
         return True
 
-    def place_wall(self, wall_type, row, column, lift=False):
+    # Places or lifts the wall. The player that places the wall is only used for hashing
+    def place_wall(self, wall_type, row, column, lift=False, player=None):
         if wall_type == 'Z':
             self.board[row][column].right = not lift
             self.board[row][column + 1].left = not lift
@@ -252,21 +343,70 @@ class Board:
             self.board[row + 1][column].top = not lift
             self.board[row + 1][column + 1].top = not lift
 
-        self.num_placed_walls += not lift
+        for slot in self.wall_slots.overlaps[wall_type][row][column]:
+            self.overlapping_walls[slot] += -1 if lift else 1
+
+        self.num_placed_walls += -1 if lift else 1
+        self.evaluation = None
+
+        # A wall that is placed and lifted again leaves the distance fields as they were
+        if self.distance_fields is not None:
+            wall = wall_type, row, column
+            if wall in self.pending_walls:
+                self.pending_walls.remove(wall)
+            else:
+                self.pending_walls.add(wall)
+
+        # Update hash
+        self.hash_key ^= self.zobrist.walls[player][wall_type][row * self.columns + column]
+
+    # Plays the move of the player whose pawn it moves and passes the turn to the opponent. Everything needed to
+    # undo it is pushed onto the undo stack and a placed wall is taken from the walls left to the player
+    def make_move(self, move):
+        hash_key, evaluation = self.hash_key, self.evaluation
+        # Repaired distance fields are new lists, so the current ones are restored as they are
+        distance_fields = self.distance_fields
+        pending_walls = None if distance_fields is None else self.pending_walls.copy()
+        player = move[0][0]
+        undo_pawn_move = self.move_pawn(*(move[0]))
+
+        wall = None
+        if len(move) == 2:
+            wall = move[1]
+            self.place_wall(*wall, player=player)
+
+            # Update the number of walls
+            self.walls_left[player]['ZP'.index(wall[0])] -= 1
+
+        self.side_to_move = 'O' if player == 'X' else 'X'
+        self.undo_stack.append((undo_pawn_move, wall, hash_key, evaluation, distance_fields, pending_walls))
+
+    # Undoes the last move played by make_move
+    def unmake_move(self):
+        undo_pawn_move, wall, hash_key, evaluation, distance_fields, pending_walls = self.undo_stack.pop()
+        player = undo_pawn_move[0]
+
+        if wall is not None:
+            self.place_wall(*wall, lift=True)
+            self.walls_left[player]['ZP'.index(wall[0])] += 1
+
+        self.side_to_move = player
+        self.move_pawn(*undo_pawn_move)
+        self.hash_key, self.evaluation = hash_key, evaluation
+        if distance_fields is not None:
+            self.distance_fields, self.pending_walls = distance_fields, pending_walls
+
+    # Passes the turn without a move, like the skip command of human players does
+    def skip_turn(self):
+        self.side_to_move = 'O' if self.side_to_move == 'X' else 'X'
+        self.hash_key ^= self.zobrist.side
 
     def check_paths_after_move(self, move, print_failure=True):
         # Make the move
         undo_move = self.move_pawn(*(move[0]))
         self.place_wall(*(move[1]))
 
-        if not self.check_path(self.player_1_pawns[0], self.player_2_start[0]) or \
-                not self.check_path(self.player_1_pawns[0], self.player_2_start[1]) or \
-                not self.check_path(self.player_1_pawns[1], self.player_2_start[0]) or \
-                not self.check_path(self.player_1_pawns[1], self.player_2_start[1]) or \
-                not self.check_path(self.player_2_pawns[0], self.player_1_start[0]) or \
-                not self.check_path(self.player_2_pawns[0], self.player_1_start[1]) or \
-                not self.check_path(self.player_2_pawns[1], self.player_1_start[0]) or \
-                not self.check_path(self.player_2_pawns[1], self.player_1_start[1]):
+        if not self.pawns_reach_goals():
             # Undo the move
             self.place_wall(*(move[1]), lift=True)
             self.move_pawn(*undo_move)
@@ -280,6 +420,46 @@ class Board:
 
         return True
 
+    # Checks if every pawn can reach both starting squares of the opponent. A pawn that reaches one goal reaches
+    # the other one if the goals are connected, so one search from the first goal of each player answers all
+    # four of its pawn-goal pairs
+    def pawns_reach_goals(self):
+        return self.reaches_all(self.player_2_start[0], (self.player_2_start[1], *self.player_1_pawns)) and \
+            self.reaches_all(self.player_1_start[0], (self.player_1_start[1], *self.player_2_pawns))
+
+    # A* search from the source that heads for one target at a time. The visited squares are shared between the
+    # targets and the search stops as soon as all of them are found
+    def reaches_all(self, source, targets):
+        remaining = {(target[0], target[1]) for target in targets}
+        remaining.discard((source[0], source[1]))
+        if not len(remaining):
+            return True
+
+        seen_set = {(source[0], source[1])}
+        destination = min(remaining, key=lambda target: self.non_diagonal_distance(source, target))
+
+        prio_queue = [(self.non_diagonal_distance(source, destination), *source)]
+        while len(prio_queue):
+            # noinspection PyTupleAssignmentBalance
+            _, row, column = heapq.heappop(prio_queue)
+
+            for new_pos in filter(lambda jump: jump not in seen_set, self.iter_non_blocking_jumps(row, column)):
+                seen_set.add(new_pos)
+                heapq.heappush(prio_queue, (self.non_diagonal_distance(new_pos, destination), *new_pos))
+
+                if new_pos in remaining:
+                    remaining.remove(new_pos)
+                    if not len(remaining):
+                        return True
+
+                    # Head for the closest of the remaining targets
+                    if new_pos == destination:
+                        destination = min(remaining, key=lambda target: self.non_diagonal_distance(new_pos, target))
+                        prio_queue = [(self.non_diagonal_distance(pos, destination), *pos) for _, *pos in prio_queue]
+                        heapq.heapify(prio_queue)
+
+        return False
+
     # A* algorithm to check if there is a pawn path from the source to the destination
     def check_path(self, source, destination):
         # Dictionary for keeping track of visited nodes
@@ -299,71 +479,230 @@ class Board:
 
         return False
 
+    # Returns the mask of the squares reachable from the square, bit (row * columns + column) stands for a square
+    def region_mask(self, row, column):
+        region = 1 << row * self.columns + column
+
+        stack = [(row, column)]
+        while len(stack):
+            for new_row, new_column in self.iter_non_blocking_jumps(*stack.pop()):
+                if not region >> new_row * self.columns + new_column & 1:
+                    region |= 1 << new_row * self.columns + new_column
+                    stack.append((new_row, new_column))
+
+        return region
+
+    # Checks the blocker of a jump from the jump tables. A diagonal through the corner on the bottom-right of the
+    # square is blocked if two wall segments meeting in the corner separate its two squares, which happens when the
+    # segments are collinear or form an L around one of the two squares
+    def wall_blocks(self, wall_mask, row, column):
+        square = self.board[row][column]
+        if wall_mask == RIGHT_WALLS:
+            return square.right
+        if wall_mask == BOTTOM_WALLS:
+            return square.bottom
+
+        right_square, bottom_square = self.board[row][column + 1], self.board[row + 1][column]
+        if square.bottom and right_square.bottom or square.right and bottom_square.right:
+            return True
+        if wall_mask == MAIN_DIAGONAL_BLOCKS:
+            return square.bottom and square.right or right_square.bottom and bottom_square.right
+        return right_square.bottom and square.right or square.bottom and bottom_square.right
+
     # Returns all one square jumps from the square with the row and column taking into account only the walls.
     # It's similar to all legal jumps except it's jumps one square away and doesn't account for player position on
     # the squares. Used for path-checking
     def iter_non_blocking_jumps(self, row, column):
-        # Top side
-        if row > 0:
-            # Top
-            if not self.board[row][column].top:
-                yield row - 1, column
-
-            # Top-Left
-            if column > 0 and not (
-                    self.board[row][column].top_left() or
-                    self.board[row - 1][column - 1].bottom_right() or
-                    (self.board[row][column].top and self.board[row][column - 1].top) or
-                    (self.board[row][column].left and self.board[row - 1][column].left)
-            ):
-                yield row - 1, column - 1
-
-            # Top-Right
-            if column < self.columns - 1 and not (
-                    self.board[row][column].top_right() or
-                    self.board[row - 1][column + 1].bottom_left() or
-                    (self.board[row][column].top and self.board[row][column + 1].top) or
-                    (self.board[row][column].right and self.board[row - 1][column].right)
-            ):
-                yield row - 1, column + 1
-
-        # Bottom side
-        if row < self.rows - 1:
-            # Bottom
-            if not self.board[row][column].bottom:
-                yield row + 1, column
-
-            # Bottom-Left
-            if column > 0 and not (
-                    self.board[row][column].bottom_left() or
-                    self.board[row + 1][column - 1].top_right() or
-                    (self.board[row][column].bottom and self.board[row][column - 1].bottom) or
-                    (self.board[row][column].left and self.board[row + 1][column].left)
-            ):
-                yield row + 1, column - 1
-
-            # Bottom-Right
-            if column < self.columns - 1 and not (
-                    self.board[row][column].bottom_right() or
-                    self.board[row + 1][column + 1].top_left() or
-                    (self.board[row][column].bottom and self.board[row][column + 1].bottom) or
-                    (self.board[row][column].right and self.board[row + 1][column].right)
-            ):
-                yield row + 1, column + 1
-
-        # Left
-        if column > 0 and not self.board[row][column].left:
-            yield row, column - 1
-
-        # Right
-        if column < self.columns - 1 and not self.board[row][column].right:
-            yield row, column + 1
+        wall_blocks = self.wall_blocks
+        for target_row, target_column, _, wall_mask, wall_row, wall_column, _ in \
+                self.jump_tables.non_blocking_jumps[row * self.columns + column]:
+            if not wall_blocks(wall_mask, wall_row, wall_column):
+                yield target_row, target_column
+
+    # Returns all legal pawn jumps of the player from the square with the row and column
+    def iter_legal_jumps(self, player, row, column):
+        wall_blocks = self.wall_blocks
+        for diagonal, target_row, target_column, _, wall_mask, wall_row, wall_column, _, \
+                far_row, far_column, far, far_wall_row, far_wall_column, _ in \
+                self.jump_tables.legal_jumps[row * self.columns + column]:
+            if wall_blocks(wall_mask, wall_row, wall_column):
+                continue
+
+            target = self.board[target_row][target_column]
+            target_start = target.starting is not None and target.starting != player
+            target_occupied = target.center == 'X' or target.center == 'O'
+
+            if diagonal:
+                if target_start or not target_occupied:
+                    yield target_row, target_column
+                continue
+
+            far_square = self.board[far_row][far_column] \
+                if far and not wall_blocks(wall_mask, far_wall_row, far_wall_column) else None
+
+            # Short jump, only onto the opponent's starting squares or up to a pawn
+            if target_start or \
+                    (not target_occupied and far_square and (far_square.center == 'X' or far_square.center == 'O')):
+                yield target_row, target_column
+
+            # Long jump
+            if far_square and ((far_square.starting is not None and far_square.starting != player) or
+                               (far_square.center != 'X' and far_square.center != 'O')):
+                yield far_row, far_column
+
+    # Lists the placed walls as (wall_type, row, column). Walls of the same type cannot overlap, so every run of wall
+    # segments is split into walls starting from its first segment
+    def placed_walls(self):
+        walls = []
+
+        for column in range(self.columns - 1):
+            wall_start = False
+            for row in range(self.rows - 1):
+                wall_start = self.right_wall(row, column) and not wall_start
+                if wall_start:
+                    walls.append(('Z', row, column))
+
+        for row in range(self.rows - 1):
+            wall_start = False
+            for column in range(self.columns - 1):
+                wall_start = self.bottom_wall(row, column) and not wall_start
+                if wall_start:
+                    walls.append(('P', row, column))
+
+        return walls
 
     @staticmethod
     def non_diagonal_distance(source, destination):
         return abs(source[0] - destination[0]) + abs(source[1] - destination[1])
 
+    # The evaluation is cached until a pawn moves or a wall is placed
     def static_evaluation(self):
+        if self.evaluation is None:
+            self.evaluation = self.path_length_evaluation() if self.path_evaluation else self.pawn_evaluation()
+
+        return self.evaluation
+
+    # Same as the pawn evaluation except the distances are the lengths of the shortest paths around the walls
+    def path_length_evaluation(self):
+        distance_fields = self.update_distance_fields()
+        columns = self.columns
+        evaluation = 0
+
+        for pawns, fields, sign in ((self.player_1_pawns, distance_fields[:2], 1),
+                                    (self.player_2_pawns, distance_fields[2:], -1)):
+            for pawn in pawns:
+                index = pawn[0] * columns + pawn[1]
+                pawn_distance_1, pawn_distance_2 = fields[0][index], fields[1][index]
+
+                if pawn_distance_1 == 0 or pawn_distance_2 == 0:
+                    return sign * inf
+
+                evaluation += sign * (1 / pawn_distance_1 + 1 / pawn_distance_2)
+
+        return evaluation
+
+    # Returns the distance fields of the goals of the first player followed by those of the second player after
+    # repairing them around the pending walls
+    def update_distance_fields(self):
+        if self.distance_fields is None:
+            self.distance_fields = [self.distance_field(goal) for goal in (*self.player_2_start, *self.player_1_start)]
+        elif self.pending_walls:
+            squares = set()
+            for wall in self.pending_walls:
+                squares.update(self.wall_region(*wall))
+
+            # All fields are repaired on the same walls, so they share the jumps. The fields are copied since
+            # unmake_move restores the ones before the move
+            jumps = {}
+            self.distance_fields = [field.copy() for field in self.distance_fields]
+            for field in self.distance_fields:
+                self.repair_distance_field(field, squares, jumps)
+
+        self.pending_walls = set()
+        return self.distance_fields
+
+    # Breadth-first search over the jumps from the goal, unreachable squares are at distance inf
+    def distance_field(self, goal):
+        field = [inf] * (self.rows * self.columns)
+        field[goal[0] * self.columns + goal[1]] = 0
+
+        queue = deque((goal,))
+        while queue:
+            row, column = queue.popleft()
+            distance = field[row * self.columns + column] + 1
+
+            for new_row, new_column in self.iter_non_blocking_jumps(row, column):
+                if field[new_row * self.columns + new_column] == inf:
+                    field[new_row * self.columns + new_column] = distance
+                    queue.append((new_row, new_column))
+
+        return field
+
+    # Squares whose jumps can change when the wall is placed or lifted
+    def wall_region(self, wall_type, row, column):
+        if wall_type == 'Z':
+            return [new_row * self.columns + new_column
+                    for new_row in range(max(row - 1, 0), min(row + 3, self.rows))
+                    for new_column in (column, column + 1)]
+        else:
+            return [new_row * self.columns + new_column
+                    for new_row in (row, row + 1)
+                    for new_column in range(max(column - 1, 0), min(column + 3, self.columns))]
+
+    # Indices of the squares reachable with one non blocking jump from the square with the index
+    def jump_indices(self, index):
+        return [row * self.columns + column
+                for row, column in self.iter_non_blocking_jumps(*divmod(index, self.columns))]
+
+    # Returns the jump indices of the square, they are kept in the cache until the walls change
+    def cached_jump_indices(self, index, cache):
+        if index not in cache:
+            cache[index] = self.jump_indices(index)
+
+        return cache[index]
+
+    # Repairs the distance field after the jumps between the squares changed. The distances can only grow on the
+    # squares whose shortest paths all lost a jump, those are found in order of distance and searched again, and
+    # shorter paths through new jumps are spread from the squares
+    def repair_distance_field(self, field, squares, jumps):
+        # Squares left without a neighbour one step closer to the goal
+        affected = set()
+        prio_queue = [(field[index], index) for index in squares if 0 < field[index] < inf]
+        heapq.heapify(prio_queue)
+        while len(prio_queue):
+            distance, index = heapq.heappop(prio_queue)
+            if index in affected:
+                continue
+
+            square_jumps = self.cached_jump_indices(index, jumps)
+            if any(field[jump] == distance - 1 and jump not in affected for jump in square_jumps):
+                continue
+
+            affected.add(index)
+            for jump in square_jumps:
+                if field[jump] == distance + 1:
+                    heapq.heappush(prio_queue, (distance + 1, jump))
+
+        for index in affected:
+            field[index] = inf
+
+        # Start from the affected squares at the distance given by their neighbours and from the changed squares
+        for index in affected:
+            field[index] = min((field[jump] + 1 for jump in self.cached_jump_indices(index, jumps)), default=inf)
+
+        prio_queue = [(field[index], index) for index in affected.union(squares) if field[index] < inf]
+        heapq.heapify(prio_queue)
+        while len(prio_queue):
+            distance, index = heapq.heappop(prio_queue)
+            if distance != field[index]:
+                continue
+
+            for jump in self.cached_jump_indices(index, jumps):
+                if distance + 1 < field[jump]:
+                    field[jump] = distance + 1
+                    heapq.heappush(prio_queue, (distance + 1, jump))
+
+    def pawn_evaluation(self):
         evaluation = 0
 
         for pawn in self.player_1_pawns:
@@ -0,0 +1,87 @@
+import mmap
+import struct
+
+from codec import encode_move, decode_move
+from symmetry import symmetries
+
+# Header of a book: magic, rows, columns, the rows and columns of the four starting squares, walls of each type per
+# player, evaluation mode (1 for path lengths), search depth and number of entries
+HEADER = struct.Struct('<8s10H3BI')
+MAGIC = b'QBOOK\x00\x02\x00'
+# Entries sorted by key: key of the canonical form of the position, encoded best move of the canonical form and
+# evaluation for the first player
+ENTRY = struct.Struct('<QIf')
+
+
+# Opening book read from a file that is memory-mapped, so opening it costs nothing and the pages of the entries
+# are only read when they are looked up. The book holds the best moves of the positions of the first plies from
+# the starting position of one board setup in their canonical form, so positions that are mirror images of each
+# other share an entry. Positions are found by a binary search over the sorted keys
+class OpeningBook:
+    def __init__(self, path):
+        with open(path, 'rb') as book_file:
+            self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, rows, columns, *rest = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            self.data.close()
+            raise ValueError(f"{path} is not an opening book")
+
+        self.rows, self.columns = rows, columns
+        starts = rest[:8]
+        self.player_1_start = ((starts[0], starts[1]), (starts[2], starts[3]))
+        self.player_2_start = ((starts[4], starts[5]), (starts[6], starts[7]))
+        self.walls = rest[8]
+        self.path_evaluation = bool(rest[9])
+        self.depth = rest[10]
+        self.entries = rest[11]
+
+        self.hits = 0
+        self.misses = 0
+
+    # Whether the book was built for the board setup and the evaluation of the board
+    def matches(self, board, walls):
+        return (board.rows, board.columns) == (self.rows, self.columns) and walls == self.walls and \
+            tuple(map(tuple, board.player_1_start)) == self.player_1_start and \
+            tuple(map(tuple, board.player_2_start)) == self.player_2_start and \
+            board.path_evaluation == self.path_evaluation
+
+    # Returns the evaluation and the best move of the position or None if it isn't in the book
+    def lookup(self, board):
+        board_symmetries = symmetries(board)
+        key, symmetry = board_symmetries.canonical_key(board)
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.data, HEADER.size + middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.entries:
+            entry_key, move, evaluation = ENTRY.unpack_from(self.data, HEADER.size + low * ENTRY.size)
+            if entry_key == key:
+                self.hits += 1
+                # Swapping the sides negates the evaluation
+                return -evaluation if symmetry[1] else evaluation, board_symmetries.move(symmetry, decode_move(move))
+
+        self.misses += 1
+        return None
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.data.close()
+
+
+# Writes the book entries given as {canonical key: (evaluation, move)} for the board setup
+def write_book(path, board, walls, depth, entries):
+    with open(path, 'wb') as book_file:
+        book_file.write(HEADER.pack(MAGIC, board.rows, board.columns,
+                                    *(coordinate for square in (*board.player_1_start, *board.player_2_start)
+                                      for coordinate in square),
+                                    walls, board.path_evaluation, depth, len(entries)))
+        for key in sorted(entries):
+            evaluation, move = entries[key]
+            book_file.write(ENTRY.pack(key, encode_move(move), evaluation))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import argparse
+import multiprocessing
+
+from main import *
+from book import write_book
+from search import legal_board_moves, search
+from symmetry import symmetries
+from transposition import transposition_table
+
+# Size of the transposition table of every process building the book
+TABLE_SIZE_MB = 64
+
+
+# Sets up the board of the game and plays the moves on it
+def play_moves(setup, moves):
+    rows, columns, walls, player_1_pawns, player_2_pawns, board_class, path_evaluation = setup
+    board = board_class(rows, columns, player_1_pawns, player_2_pawns, walls)
+    board.path_evaluation = path_evaluation
+    for move in moves:
+        board.make_move(move)
+
+    return board
+
+
+# Searches the position after the moves from the start to the depth in a process of the pool. Returns the key, the
+# evaluation and the best move of the canonical form of the position and the moves the book follows from it: the
+# best move and the ones first in the move order
+def search_book_position(setup, options, depth, width, moves):
+    board = play_moves(setup, moves)
+    board_symmetries = symmetries(board)
+    key, symmetry = board_symmetries.canonical_key(board)
+    if board.game_end():
+        return key, None, None, ()
+
+    _, evaluation, best_move, _ = search(board, depth, transposition_table(TABLE_SIZE_MB), options=options)
+    if best_move is None:
+        return key, None, None, ()
+
+    continuations = [best_move, *(move for move in legal_board_moves(board)[:width] if move != best_move)][:width]
+    return key, -evaluation if symmetry[1] else evaluation, board_symmetries.move(symmetry, best_move), continuations
+
+
+# Builds the book of the board setup and engine settings of the config. Every position of the first plies that the
+# book follows is searched to the depth, the positions of one ply are searched in parallel
+def build_book(path, plies, depth, width, processes=None):
+    game = Game()
+    game.read_config()
+    player = Computer('X', game)
+    game.player_1 = game.player_2 = player
+    game.configure_players()
+    options = player.search_options()
+    setup = (game.rows, game.columns, game.walls, game.player_1_pawns, game.player_2_pawns, game.board_class,
+             game.path_evaluation)
+
+    entries = {}
+    lines = [()]
+    with multiprocessing.Pool(processes) as pool:
+        for ply in range(plies):
+            print(f"Ply {ply + 1}: searching {len(lines)} positions to depth {depth}")
+            results = pool.starmap(search_book_position, [(setup, options, depth, width, line) for line in lines])
+
+            next_lines = []
+            for line, (key, evaluation, best_move, continuations) in zip(lines, results):
+                # Transpositions and mirror images of positions are only followed once
+                if best_move is None or key in entries:
+                    continue
+
+                entries[key] = evaluation, best_move
+                next_lines += [(*line, move) for move in continuations]
+            lines = next_lines
+
+    write_book(path, play_moves(setup, ()), game.walls, depth, entries)
+    print(f"Wrote {len(entries)} positions to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds an opening book of the board setup of the config")
+    parser.add_argument("--output", default="book.bin", help="File the book is written to")
+    parser.add_argument("--plies", type=int, default=4, help="Number of plies from the start covered by the book")
+    parser.add_argument("--depth", type=int, default=4, help="Depth of the search of every position")
+    parser.add_argument("--width", type=int, default=3, help="Number of moves followed from every position")
+    parser.add_argument("--processes", type=int, default=None, help="Number of positions searched at once")
+    arguments = parser.parse_args()
+
+    build_book(arguments.output, arguments.plies, arguments.depth, arguments.width, arguments.processes)
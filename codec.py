@@ -0,0 +1,111 @@
+import base64
+import struct
+
+# Version of the position encoding, the first byte of every encoded position
+POSITION_VERSION = 1
+
+# Encoded position: version, rows, columns, flags (FLAG_SECOND_PLAYER if the second player is to move and
+# FLAG_PATH_EVALUATION for the path evaluation), the starting squares and the pawn squares of both players as row
+# and column, the walls left (vertical and horizontal of both players) and the Zobrist hash of the board. It is
+# followed by the bitmaps of the vertical and the horizontal walls, where bit (row * (columns - 1) + column) is set
+# for a wall placed at the row and column
+POSITION_HEADER = struct.Struct('<4B8B8B4BQ')
+FLAG_SECOND_PLAYER = 1
+FLAG_PATH_EVALUATION = 2
+
+# Moves are encoded into integers of this many bits, 0 stands for no move
+MOVE_BITS = 25
+
+
+# Bytes of each wall bitmap of the geometry
+def wall_bitmap_size(rows, columns):
+    return ((rows - 1) * (columns - 1) + 7) // 8
+
+
+# Encodes the position on the board into a few dozen bytes
+def encode_position(board):
+    bitmaps = {'Z': 0, 'P': 0}
+    for wall_type, row, column in board.placed_walls():
+        bitmaps[wall_type] |= 1 << row * (board.columns - 1) + column
+
+    flags = (board.side_to_move == 'O') * FLAG_SECOND_PLAYER | board.path_evaluation * FLAG_PATH_EVALUATION
+    size = wall_bitmap_size(board.rows, board.columns)
+    return POSITION_HEADER.pack(
+        POSITION_VERSION, board.rows, board.columns, flags,
+        *board.player_1_start[0], *board.player_1_start[1], *board.player_2_start[0], *board.player_2_start[1],
+        *board.player_1_pawns[0], *board.player_1_pawns[1], *board.player_2_pawns[0], *board.player_2_pawns[1],
+        *board.walls_left['X'], *board.walls_left['O'], board.hash_key) + \
+        bitmaps['Z'].to_bytes(size, 'little') + bitmaps['P'].to_bytes(size, 'little')
+
+
+# Rebuilds the position as a board of the class. Raises ValueError for data of another version of the encoding
+def decode_position(data, board_class):
+    if not data or data[0] != POSITION_VERSION:
+        raise ValueError(f"Unsupported position encoding version {data[0] if data else None}")
+
+    _, rows, columns, flags, *squares = POSITION_HEADER.unpack_from(data)
+    starts, pawns, walls_left, hash_key = squares[:8], squares[8:16], squares[16:20], squares[20]
+
+    board = board_class(rows, columns, [list(starts[0:2]), list(starts[2:4])], [list(starts[4:6]), list(starts[6:8])])
+    board.set_pawns([list(pawns[0:2]), list(pawns[2:4])], [list(pawns[4:6]), list(pawns[6:8])])
+
+    size = wall_bitmap_size(rows, columns)
+    for offset, wall_type in ((POSITION_HEADER.size, 'Z'), (POSITION_HEADER.size + size, 'P')):
+        bitmap = int.from_bytes(data[offset:offset + size], 'little')
+        while bitmap:
+            bit = bitmap & -bitmap
+            bitmap ^= bit
+            board.place_wall(wall_type, *divmod(bit.bit_length() - 1, columns - 1))
+
+    # The hash depends on who placed the walls, which the position doesn't keep
+    board.hash_key = hash_key
+    board.path_evaluation = bool(flags & FLAG_PATH_EVALUATION)
+    board.side_to_move = 'O' if flags & FLAG_SECOND_PLAYER else 'X'
+    board.walls_left = {'X': list(walls_left[0:2]), 'O': list(walls_left[2:4])}
+
+    return board
+
+
+# Position as printable text for logs and test fixtures
+def position_string(board):
+    return base64.urlsafe_b64encode(encode_position(board)).decode().rstrip('=')
+
+
+def board_from_string(text, board_class):
+    return decode_position(base64.urlsafe_b64decode(text + '=' * (-len(text) % 4)), board_class)
+
+
+# Packs a move into an integer, 0 stands for no move.
+# Bits from the lowest: player, pawn index, row, column (5 bits each), then the wall flag, type, row and column
+def encode_move(move):
+    if move is None:
+        return 0
+
+    (player, pawn_index, row, column), *wall = move
+    code = (player == 'O') | pawn_index << 1 | row << 2 | column << 7
+    if wall:
+        wall_type, wall_row, wall_column = wall[0]
+        code |= 1 << 12 | (wall_type == 'P') << 13 | wall_row << 14 | wall_column << 19
+
+    return code + 1
+
+
+def decode_move(code):
+    if code == 0:
+        return None
+
+    code -= 1
+    pawn_move = ('O' if code & 1 else 'X', code >> 1 & 1, code >> 2 & 31, code >> 7 & 31)
+    if not code >> 12 & 1:
+        return pawn_move,
+
+    return pawn_move, ('P' if code >> 13 & 1 else 'Z', code >> 14 & 31, code >> 19 & 31)
+
+
+# Moves of a principal variation as a tuple of codes and back
+def encode_moves(moves):
+    return tuple(map(encode_move, moves))
+
+
+def decode_moves(codes):
+    return tuple(map(decode_move, codes))
@@ -0,0 +1,375 @@
+import signal
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from copy import deepcopy
+from functools import partial
+from math import inf
+from multiprocessing import shared_memory, resource_tracker
+
+from board import Board
+from bitboard import BitBoard
+from codec import encode_position, decode_position, encode_move, decode_move, encode_moves, decode_moves, \
+    POSITION_HEADER, wall_bitmap_size
+from geometry import wall_slots
+from search import MoveOrdering, SearchTimeout, search_move, search_tree
+from transposition import SharedTranspositionTable, ThreadTranspositionTable, transposition_table, \
+    transposition_tables
+
+BOARD_BACKENDS = {"grid": Board, "bitboard": BitBoard}
+
+# Published position: sequence number, board backend, size of the encoded position and number of root moves. It is
+# followed by the position encoded by encode_position and the root moves packed by encode_move
+POSITION = struct.Struct('<QBHI')
+MOVE = struct.Struct('<I')
+# Most pawn moves of a player: a long, a short and a diagonal jump in each of the four directions for both pawns
+MAX_PAWN_MOVES = 2 * 12
+
+# Position cached by a worker process, rebuilt when a task carries a newer version
+worker_state = {"version": None}
+
+
+# Process pool that lives as long as the game. Positions are published in shared memory before a search, so the
+# tasks only carry the version of the position and the index of the root move to search. The number of processes
+# defaults to the number of cores
+class Engine:
+    def __init__(self, processes=None):
+        self.processes = processes
+        self.pool = None
+        self.shared_memory = None
+        self.sequence = 0
+        # Transposition table of the parallel search, the processes of the root split keep tables of their own
+        self.table = None
+
+    def start(self, rows, columns, table_size_mb, shared_table=False):
+        if self.pool is not None:
+            return
+
+        # Room for the position and for a root move per pawn move and wall slot of either type
+        size = POSITION.size + POSITION_HEADER.size + 2 * wall_bitmap_size(rows, columns) + \
+            MAX_PAWN_MOVES * wall_slots(rows, columns).count * MOVE.size
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=size)
+        if shared_table:
+            self.table = SharedTranspositionTable(table_size_mb)
+
+        self.processes = self.processes or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.processes, initializer=init_worker, initargs=(
+            self.shared_memory.name, table_size_mb, None if self.table is None else self.table.shared_memory.name))
+
+    def shutdown(self):
+        if self.pool is not None:
+            # Searches that ran out of time may still be running
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+        if self.shared_memory is not None:
+            self.shared_memory.close()
+            self.shared_memory.unlink()
+            self.shared_memory = None
+
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    # Writes the position and the root moves of the player into shared memory and returns the version of the
+    # position. The sequence number is odd while writing, so workers never read a half-written position
+    def publish(self, board, player, moves):
+        self.start(board.rows, board.columns, player.table_size_mb, player.parallel == "smp")
+
+        position = encode_position(board)
+        buffer = self.shared_memory.buf
+
+        self.sequence += 1
+        struct.pack_into('<Q', buffer, 0, self.sequence)
+
+        POSITION.pack_into(buffer, 0, self.sequence, tuple(BOARD_BACKENDS.values()).index(type(board)),
+                           len(position), len(moves))
+        buffer[POSITION.size:POSITION.size + len(position)] = position
+
+        offset = POSITION.size + len(position)
+        for move in moves:
+            MOVE.pack_into(buffer, offset, encode_move(move))
+            offset += MOVE.size
+
+        self.sequence += 1
+        struct.pack_into('<Q', buffer, 0, self.sequence)
+
+        return self.sequence
+
+    # Searches the root moves with the given indices asynchronously within the window, every task gets the matching
+    # principal variation. Moves travel to and from the processes packed by encode_move
+    def search(self, version, indices, depth, deadline, principal_variations, options=None, window=(-inf, inf)):
+        return PoolSearch(self.pool.starmap_async(search_root_move, [
+            (version, index, depth, deadline, encode_moves(principal_variation), options, window)
+            for index, principal_variation in zip(indices, principal_variations)]))
+
+    # Searches the whole tree of the position in every process, staggered by the index of the helper. The results
+    # are yielded in the order the helpers finish
+    def search_tree(self, version, depth, deadline, options=None):
+        for result in self.pool.imap_unordered(partial(search_position, version, depth, deadline, options),
+                                               range(self.processes)):
+            if result is not None:
+                completed_depth, evaluation, best_move, principal_variation, *stats = result
+                result = completed_depth, evaluation, decode_move(best_move), decode_moves(principal_variation), \
+                    *stats
+            yield result
+
+    # Stops the searches of the position with the version. The position stays the same under a newer version
+    def stop(self, version):
+        if self.sequence == version:
+            self.sequence += 2
+            struct.pack_into('<Q', self.shared_memory.buf, 0, self.sequence)
+
+
+# Asynchronous results of the root moves searched by the pool with the principal variations decoded
+class PoolSearch:
+    def __init__(self, async_result):
+        self.async_result = async_result
+
+    def get(self, timeout=None):
+        return [result if result is None else (result[0], decode_moves(result[1]), *result[2:])
+                for result in self.async_result.get(timeout)]
+
+
+# Searches the root moves one after the other in the calling process, for games played in processes that can't
+# start a pool of their own like the games of a tournament
+class SerialEngine:
+    def __init__(self):
+        self.position = None
+        self.ordering = None
+
+    def shutdown(self):
+        pass
+
+    def publish(self, board, player, moves):
+        self.position = board, player, moves
+        self.ordering = MoveOrdering()
+        return 0
+
+    def search(self, version, indices, depth, deadline, principal_variations, options=None, window=(-inf, inf)):
+        return SerialSearch(self.position, indices, depth, deadline, principal_variations, options, window,
+                            self.ordering)
+
+    def search_tree(self, version, depth, deadline, options=None):
+        board, player, moves = self.position
+        return [search_tree(board, moves, 0, depth, transposition_table(player.table_size_mb, player.table_name),
+                            deadline, options)]
+
+    def stop(self, version):
+        pass
+
+
+# Stands in for the asynchronous result of the pool, the root moves are searched when the results are requested
+class SerialSearch:
+    def __init__(self, position, indices, depth, deadline, principal_variations, options, window, ordering):
+        self.position = position
+        self.indices = indices
+        self.depth = depth
+        self.deadline = deadline
+        self.principal_variations = principal_variations
+        self.options = options
+        self.window = window
+        self.ordering = ordering
+
+    def get(self, timeout=None):
+        board, player, moves = self.position
+        table = transposition_table(player.table_size_mb, player.table_name)
+        return [search_move(board, moves[index], self.depth, table, self.deadline, principal_variation,
+                            self.options, window=self.window, ordering=self.ordering)
+                for index, principal_variation in zip(self.indices, self.principal_variations)]
+
+
+# Searches in a pool of threads of the calling process, which run in parallel on free-threaded builds of CPython
+# and need neither processes nor shared memory for the position. Every thread searches a copy of the published
+# board and the threads share one transposition table
+class ThreadEngine:
+    def __init__(self, processes=None):
+        self.processes = processes
+        self.executor = None
+        self.table = None
+        self.sequence = 0
+        # Version, board and root moves of the published position
+        self.position = None
+        # Copy of the board and the move ordering of the root moves of every thread
+        self.local = threading.local()
+
+    def start(self, table_size_mb):
+        if self.executor is not None:
+            return
+
+        self.processes = self.processes or multiprocessing.cpu_count()
+        self.executor = ThreadPoolExecutor(self.processes)
+        self.table = ThreadTranspositionTable(table_size_mb)
+
+    def shutdown(self):
+        if self.executor is not None:
+            # Searches that ran out of time may still be running, a newer version stops them
+            self.sequence += 1
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    def publish(self, board, player, moves):
+        self.start(player.table_size_mb)
+
+        self.sequence += 1
+        self.position = self.sequence, deepcopy(board), list(moves)
+        return self.sequence
+
+    def search(self, version, indices, depth, deadline, principal_variations, options=None, window=(-inf, inf)):
+        return ThreadSearch([self.executor.submit(self.search_root_move, version, index, depth, deadline,
+                                                  principal_variation, options, window)
+                             for index, principal_variation in zip(indices, principal_variations)])
+
+    def search_tree(self, version, depth, deadline, options=None):
+        futures = [self.executor.submit(self.search_position, version, depth, deadline, options, helper)
+                   for helper in range(self.processes)]
+        return (future.result() for future in as_completed(futures))
+
+    def stop(self, version):
+        if self.sequence == version:
+            self.sequence += 1
+
+    # Returns the copy of the board of the thread and the root moves or None if a newer position was published
+    def load_version(self, version):
+        published_version, board, moves = self.position
+        if published_version != version:
+            return None
+
+        if getattr(self.local, "version", None) != version:
+            self.local.version, self.local.board, self.local.ordering = version, deepcopy(board), MoveOrdering()
+        return self.local.board, moves
+
+    # Tasks of the threads like the ones of the worker processes, the searches stop once the version is outdated
+    def search_root_move(self, version, index, depth, deadline, principal_variation, options, window):
+        position = self.load_version(version)
+        if position is None:
+            return None
+
+        board, moves = position
+        try:
+            return search_move(board, moves[index], depth, self.table, deadline, principal_variation, options,
+                               lambda: self.sequence != version, window, self.local.ordering)
+        except SearchTimeout:
+            if self.sequence != version:
+                return None
+            raise
+
+    def search_position(self, version, depth, deadline, options, helper):
+        position = self.load_version(version)
+        if position is None:
+            return None
+
+        board, moves = position
+        return search_tree(board, moves, helper, depth, self.table, deadline, options,
+                           lambda: self.sequence != version)
+
+
+# Stands in for the asynchronous result of the pool for the futures of the thread pool
+class ThreadSearch:
+    def __init__(self, futures):
+        self.futures = futures
+
+    def get(self, timeout=None):
+        if wait(self.futures, timeout).not_done:
+            raise multiprocessing.TimeoutError()
+
+        return [future.result() for future in self.futures]
+
+
+def init_worker(shared_memory_name, table_size_mb, table_memory_name=None):
+    # Interrupts are handled by the main process which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    worker_state["shared_memory"] = shared_memory.SharedMemory(name=shared_memory_name)
+    attached = [worker_state["shared_memory"]]
+    # The players of the worker use the shared table in place of a table of their own
+    if table_memory_name is not None:
+        table = SharedTranspositionTable(table_size_mb, table_memory_name)
+        transposition_tables[(None, table_size_mb)] = table
+        attached.append(table.shared_memory)
+
+    # The main process owns the shared memory and unlinks it. Forked workers share its resource tracker
+    if multiprocessing.get_start_method() != "fork":
+        for memory in attached:
+            resource_tracker.unregister(memory._name, "shared_memory")
+    worker_state["table_size_mb"] = table_size_mb
+
+
+# Copies the published position out of shared memory, retrying while it is being written
+def read_position():
+    buffer = worker_state["shared_memory"].buf
+
+    while True:
+        sequence = struct.unpack_from('<Q', buffer, 0)[0]
+        if sequence % 2:
+            continue
+
+        header = POSITION.unpack_from(buffer, 0)
+        _, _, position_size, num_moves = header
+        position = bytes(buffer[POSITION.size:POSITION.size + position_size])
+        moves_offset = POSITION.size + position_size
+        moves = [MOVE.unpack_from(buffer, moves_offset + index * MOVE.size)[0] for index in range(num_moves)]
+
+        if struct.unpack_from('<Q', buffer, 0)[0] == sequence:
+            return header, position, moves
+
+
+# Rebuilds the board from the published position, the move ordering starts over with it
+def load_position(header, position, moves):
+    worker_state["board"] = decode_position(position, tuple(BOARD_BACKENDS.values())[header[1]])
+    worker_state["moves"] = [decode_move(move) for move in moves]
+    worker_state["ordering"] = MoveOrdering()
+
+
+# Loads the position with the version unless it is already loaded, returns False if a newer one was published
+def load_version(version):
+    if struct.unpack_from('<Q', worker_state["shared_memory"].buf, 0)[0] != version:
+        return False
+
+    if worker_state["version"] != version:
+        header, position, moves = read_position()
+        if header[0] != version:
+            return False
+
+        load_position(header, position, moves)
+        worker_state["version"] = version
+
+    return True
+
+
+# Task run by the workers, returns the result of search_move or None if a newer position was published. The search
+# stops early once the position gets a newer version
+def search_root_move(version, index, depth, deadline, principal_variation, options, window):
+    if not load_version(version):
+        return None
+
+    buffer = worker_state["shared_memory"].buf
+    try:
+        evaluation, principal_variation, *stats = search_move(
+            worker_state["board"], worker_state["moves"][index], depth,
+            transposition_table(worker_state["table_size_mb"]), deadline, decode_moves(principal_variation), options,
+            lambda: struct.unpack_from('<Q', buffer, 0)[0] != version, window, worker_state["ordering"])
+    except SearchTimeout:
+        if struct.unpack_from('<Q', buffer, 0)[0] != version:
+            return None
+        raise
+    return evaluation, encode_moves(principal_variation), *stats
+
+
+# Task of the parallel search, returns the result of search_tree or None if a newer position was published. The
+# search stops early once the position gets a newer version
+def search_position(version, depth, deadline, options, helper):
+    if not load_version(version):
+        return None
+
+    buffer = worker_state["shared_memory"].buf
+    completed_depth, evaluation, best_move, principal_variation, *stats = search_tree(
+        worker_state["board"], worker_state["moves"], helper, depth, transposition_table(worker_state["table_size_mb"]),
+        deadline, options, lambda: struct.unpack_from('<Q', buffer, 0)[0] != version)
+    return completed_depth, evaluation, encode_move(best_move), encode_moves(principal_variation), *stats
@@ -0,0 +1,164 @@
+# Jump tables and wall slots depend only on the number of rows and columns, so they are built once per geometry in
+# every process
+jump_tables_cache = {}
+wall_slots_cache = {}
+
+# Wall masks of the bitboard a jump can be blocked by, in the order of BitBoard.wall_masks
+RIGHT_WALLS = 0
+BOTTOM_WALLS = 1
+MAIN_DIAGONAL_BLOCKS = 2
+ANTI_DIAGONAL_BLOCKS = 3
+
+
+# Lists the jumps from every square of the board with the wall segment or corner that blocks them, so that
+# generating jumps only checks walls instead of the board edges and wall rules. A blocker is given by the wall mask,
+# the row and column of the square its segment belongs to and the bit of that square, the same goes for target
+# squares. Bit (row * columns + column) corresponds to the square (row, column)
+class JumpTables:
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+
+        # One square jumps that ignore the pawns: (row, column, bit, wall mask, wall row, wall column, wall bit)
+        self.non_blocking_jumps = [self.square_non_blocking_jumps(row, column)
+                                   for row in range(rows) for column in range(columns)]
+        # Pawn jumps: (diagonal, row, column, bit, wall mask, wall row, wall column, wall bit, far row, far column,
+        # far bit, far wall row, far wall column, far wall bit). Diagonal jumps only go to the first square.
+        # Straight jumps go one or two squares, the far square is two squares away behind a wall of the same mask
+        # and its bit is 0 if it's off the board
+        self.legal_jumps = [self.square_legal_jumps(row, column)
+                            for row in range(rows) for column in range(columns)]
+
+    def square_non_blocking_jumps(self, row, column):
+        jumps = []
+
+        # Top side
+        if row > 0:
+            jumps.append((*self.square(row - 1, column), *self.blocker(BOTTOM_WALLS, row - 1, column)))
+            if column > 0:
+                jumps.append((*self.square(row - 1, column - 1),
+                              *self.blocker(MAIN_DIAGONAL_BLOCKS, row - 1, column - 1)))
+            if column < self.columns - 1:
+                jumps.append((*self.square(row - 1, column + 1),
+                              *self.blocker(ANTI_DIAGONAL_BLOCKS, row - 1, column)))
+
+        # Bottom side
+        if row < self.rows - 1:
+            jumps.append((*self.square(row + 1, column), *self.blocker(BOTTOM_WALLS, row, column)))
+            if column > 0:
+                jumps.append((*self.square(row + 1, column - 1),
+                              *self.blocker(ANTI_DIAGONAL_BLOCKS, row, column - 1)))
+            if column < self.columns - 1:
+                jumps.append((*self.square(row + 1, column + 1), *self.blocker(MAIN_DIAGONAL_BLOCKS, row, column)))
+
+        # Left and right
+        if column > 0:
+            jumps.append((*self.square(row, column - 1), *self.blocker(RIGHT_WALLS, row, column - 1)))
+        if column < self.columns - 1:
+            jumps.append((*self.square(row, column + 1), *self.blocker(RIGHT_WALLS, row, column)))
+
+        return tuple(jumps)
+
+    def square_legal_jumps(self, row, column):
+        jumps = []
+
+        # Top side
+        if row > 0:
+            if column > 0:
+                jumps.append(self.diagonal_jump(row - 1, column - 1, MAIN_DIAGONAL_BLOCKS, row - 1, column - 1))
+            if column < self.columns - 1:
+                jumps.append(self.diagonal_jump(row - 1, column + 1, ANTI_DIAGONAL_BLOCKS, row - 1, column))
+            jumps.append(self.straight_jump(row - 1, column, BOTTOM_WALLS, row - 1, column,
+                                            row - 2, column, row - 2, column))
+
+        # Bottom side
+        if row < self.rows - 1:
+            if column > 0:
+                jumps.append(self.diagonal_jump(row + 1, column - 1, ANTI_DIAGONAL_BLOCKS, row, column - 1))
+            if column < self.columns - 1:
+                jumps.append(self.diagonal_jump(row + 1, column + 1, MAIN_DIAGONAL_BLOCKS, row, column))
+            jumps.append(self.straight_jump(row + 1, column, BOTTOM_WALLS, row, column,
+                                            row + 2, column, row + 1, column))
+
+        # Left and right
+        if column > 0:
+            jumps.append(self.straight_jump(row, column - 1, RIGHT_WALLS, row, column - 1,
+                                            row, column - 2, row, column - 2))
+        if column < self.columns - 1:
+            jumps.append(self.straight_jump(row, column + 1, RIGHT_WALLS, row, column,
+                                            row, column + 2, row, column + 1))
+
+        return tuple(jumps)
+
+    def square(self, row, column):
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            return row, column, 1 << row * self.columns + column
+        return row, column, 0
+
+    def blocker(self, wall_mask, row, column):
+        return wall_mask, *self.square(row, column)
+
+    def diagonal_jump(self, row, column, wall_mask, wall_row, wall_column):
+        return True, *self.square(row, column), *self.blocker(wall_mask, wall_row, wall_column), -1, -1, 0, -1, -1, 0
+
+    def straight_jump(self, row, column, wall_mask, wall_row, wall_column, far_row, far_column, far_wall_row,
+                      far_wall_column):
+        return False, *self.square(row, column), *self.blocker(wall_mask, wall_row, wall_column), \
+            *self.square(far_row, far_column), far_wall_row, far_wall_column, \
+            self.square(far_wall_row, far_wall_column)[2]
+
+
+def jump_tables(rows, columns):
+    if (rows, columns) not in jump_tables_cache:
+        jump_tables_cache[(rows, columns)] = JumpTables(rows, columns)
+
+    return jump_tables_cache[(rows, columns)]
+
+
+# Wall slots are indexed by (type * (rows - 1) + row) * (columns - 1) + column with the vertical walls ('Z') first
+class WallSlots:
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.count = 2 * (rows - 1) * (columns - 1)
+
+        # Slots of the walls of the same type that overlap the wall in every slot, including its own slot
+        self.overlaps = {wall_type: [[self.overlapping_slots(wall_type, row, column) for column in range(columns - 1)]
+                                     for row in range(rows - 1)]
+                         for wall_type in 'ZP'}
+
+        # Slots sorted for every pair of starting squares
+        self.orders = {}
+
+    def slot(self, wall_type, row, column):
+        return ('ZP'.index(wall_type) * (self.rows - 1) + row) * (self.columns - 1) + column
+
+    def overlapping_slots(self, wall_type, row, column):
+        if wall_type == 'Z':
+            walls = ((row - 1, column), (row, column), (row + 1, column))
+        else:
+            walls = ((row, column - 1), (row, column), (row, column + 1))
+
+        return tuple(self.slot(wall_type, wall_row, wall_column) for wall_row, wall_column in walls
+                     if 0 <= wall_row < self.rows - 1 and 0 <= wall_column < self.columns - 1)
+
+    # Returns (wall, slot) of all walls sorted by the distance to the closest of the starting squares, walls in
+    # the same slot are ordered by row and column with the vertical wall first
+    def order(self, starting):
+        key = tuple(map(tuple, starting))
+
+        if key not in self.orders:
+            walls = [(wall_type, row, column)
+                     for row in range(self.rows - 1) for column in range(self.columns - 1) for wall_type in 'ZP']
+            walls.sort(key=lambda wall: min(abs(wall[1] - square[0]) + abs(wall[2] - square[1])
+                                            for square in starting))
+            self.orders[key] = tuple((wall, self.slot(*wall)) for wall in walls)
+
+        return self.orders[key]
+
+
+def wall_slots(rows, columns):
+    if (rows, columns) not in wall_slots_cache:
+        wall_slots_cache[(rows, columns)] = WallSlots(rows, columns)
+
+    return wall_slots_cache[(rows, columns)]
@@ -0,0 +1,30 @@
+from timeit import default_timer
+
+
+# Counters and phase times of the search of a root move. They are only kept when the player is instrumented,
+# otherwise the search only checks that there are no stats to fill
+class SearchStats:
+    def __init__(self):
+        self.counters = {}
+        self.times = {}
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Calls the function and adds the time it took to the phase. Phases can be nested, the time of a phase includes
+    # the time of the phases inside it
+    def timed(self, phase, function, *args, **kwargs):
+        start = default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.times[phase] = self.times.get(phase, 0) + default_timer() - start
+
+    def as_dict(self):
+        return {**self.counters, **{f"{phase} seconds": seconds for phase, seconds in self.times.items()}}
+
+
+# Adds the stats of a root move to the totals of a computer move
+def merge_stats(totals, stats):
+    for name, value in stats.items():
+        totals[name] = totals.get(name, 0) + value
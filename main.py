@@ -7,6 +7,10 @@ from itertools import cycle
 
 from players import *
 from board import *
+from bitboard import *
+from engine import *
+from analysis import AnalysisCache, ANALYSIS_CACHE_ENTRIES
+from book import OpeningBook
 
 
 class Game:
@@ -19,6 +23,36 @@ class Game:
         self.player_1 = None
         self.player_2 = None
         self.board = None
+        self.board_class = BitBoard
+        self.table_size_mb = 32
+        self.move_time = 0
+        self.search_depth = 3
+        self.path_evaluation = False
+        self.instrumented = False
+        self.ponder = True
+        self.parallel = "root"
+        # Number of search processes, 0 starts one per core
+        self.processes = 0
+        # Run the searches in processes or in threads, which only run in parallel on free-threaded builds
+        self.workers = "processes"
+        self.search_algorithm = "alphabeta"
+        self.aspiration_window = 0.25
+        self.full_depth_moves = 4
+        self.late_move_reduction = 2
+        self.late_move_pruning_depth = 2
+        self.late_move_margin = 0.25
+        self.null_move = True
+        self.null_move_reduction = 2
+        self.race_solver = True
+        # File of the analysis cache kept between runs, which is off without one
+        self.analysis_cache_path = ""
+        self.analysis_cache_entries = ANALYSIS_CACHE_ENTRIES
+        self.analysis_cache = None
+        # File of the opening book built by build_book.py, which is off without one
+        self.opening_book_path = ""
+        self.opening_book = None
+        # Search processes shared by the computer moves of the whole game
+        self.engine = Engine()
         signal.signal(signal.SIGINT, self.handle_interrupt)
 
     # Board and initial settings setup
@@ -31,19 +65,61 @@ class Game:
         if self.yes_no_prompt("Do you wish to play?"):
             if self.yes_no_prompt("Do you wish to play versus a computer?"):
                 if self.yes_no_prompt("Do you wish to play first?"):
-                    self.player_1 = Human('X', self.walls, self)
-                    self.player_2 = Computer('O', self.walls, self)
+                    self.player_1 = Human('X', self)
+                    self.player_2 = Computer('O', self)
                 else:
-                    self.player_1 = Computer('X', self.walls, self)
-                    self.player_2 = Human('O', self.walls, self)
+                    self.player_1 = Computer('X', self)
+                    self.player_2 = Human('O', self)
             else:
-                self.player_1 = Human('X', self.walls, self)
-                self.player_2 = Human('O', self.walls, self)
+                self.player_1 = Human('X', self)
+                self.player_2 = Human('O', self)
         else:
-            self.player_1 = Computer('X', self.walls, self)
-            self.player_2 = Computer('O', self.walls, self)
+            self.player_1 = Computer('X', self)
+            self.player_2 = Computer('O', self)
+
+        self.configure_players()
+        if self.workers == "threads":
+            self.engine = ThreadEngine()
+        self.engine.processes = self.processes or None
+        if self.analysis_cache_path:
+            self.analysis_cache = AnalysisCache(self.analysis_cache_path, self.analysis_cache_entries)
+        self.board = self.board_class(self.rows, self.columns, self.player_1_pawns, self.player_2_pawns, self.walls)
+        self.board.path_evaluation = self.path_evaluation
+        if self.opening_book_path:
+            self.open_opening_book()
+
+    # Applies the engine settings to the players
+    def configure_players(self):
+        for player in (self.player_1, self.player_2):
+            player.table_size_mb = self.table_size_mb
+            player.move_time = self.move_time
+            player.search_depth = self.search_depth
+            player.instrumented = self.instrumented
+            player.ponder = self.ponder
+            player.parallel = self.parallel
+            player.search_algorithm = self.search_algorithm
+            player.aspiration_window = self.aspiration_window
+            player.full_depth_moves = self.full_depth_moves
+            player.late_move_reduction = self.late_move_reduction
+            player.late_move_pruning_depth = self.late_move_pruning_depth
+            player.late_move_margin = self.late_move_margin
+            player.null_move = self.null_move
+            player.null_move_reduction = self.null_move_reduction
+            player.race_solver = self.race_solver
+
+    # Memory-maps the opening book, a book of another board setup or evaluation is left out
+    def open_opening_book(self):
+        try:
+            book = OpeningBook(self.opening_book_path)
+        except (OSError, ValueError) as error:
+            print(f"Unable to open the opening book: {error}")
+            return
 
-        self.board = Board(self.rows, self.columns, self.player_1_pawns, self.player_2_pawns)
+        if book.matches(self.board, self.walls):
+            self.opening_book = book
+        else:
+            print("The opening book was built for another board setup or evaluation")
+            book.close()
 
     # Actual game logic
     def run(self):
@@ -52,12 +128,16 @@ class Game:
         moves = 0
 
         while not self.board.game_end():
-            current_player = next(player_cycle)
+            waiting_player, current_player = current_player, next(player_cycle)
             moves += 1
 
             self.board.print_board()
             print(f"Move: {moves}")
-            current_player.print_player_info()
+            current_player.print_player_info(self.board)
+
+            # The computer searches its reply to the expected move while a human thinks
+            if isinstance(current_player, Human) and isinstance(waiting_player, Computer):
+                waiting_player.start_pondering(self.board)
 
             # Get the move and test for a draw
             move = current_player.get_move(self.board)
@@ -67,8 +147,10 @@ class Game:
                 print('-' * 50)
                 return
             # Check for turn skipping (as a human command)
-            elif move != ():
-                self.board = current_player.play_move(self.board, move)
+            elif move == ():
+                self.board.skip_turn()
+            else:
+                self.board.make_move(move)
 
         self.board.print_board()
         current_player.print_winner(moves)
@@ -158,6 +240,9 @@ class Game:
                 elif key == "p2_pawn2_column":
                     self.player_2_pawns[1][1] = val - 1
 
+            if config.has_section("ENGINE"):
+                read_engine_config(self, config["ENGINE"])
+
         except IOError:
             print("Unable to read or create config falling back to default values")
         finally:
@@ -195,13 +280,28 @@ class Game:
                                 "p1_pawn2_row": "8", "p1_pawn2_column": "4",
                                 "p2_pawn1_row": "4", "p2_pawn1_column": "11",
                                 "p2_pawn2_row": "8", "p2_pawn2_column": "11"}
+        config["ENGINE"] = {"backend": "bitboard", "tt_size_mb": "32", "move_time": "0", "search_depth": "3",
+                            "evaluation": "distance", "instrumentation": "false", "ponder": "true",
+                            "parallel": "root", "processes": "0", "workers": "processes",
+                            "search": "alphabeta", "aspiration_window": "0.25", "full_depth_moves": "4",
+                            "late_move_reduction": "2", "late_move_pruning_depth": "2", "late_move_margin": "0.25",
+                            "null_move": "true", "null_move_reduction": "2", "race_solver": "true",
+                            "analysis_cache": "", "analysis_cache_entries": str(ANALYSIS_CACHE_ENTRIES),
+                            "opening_book": ""}
         with open("config.ini", "w") as configfile:
             config.write(configfile)
 
-    @staticmethod
-    def handle_interrupt(signum, frame):
+    def handle_interrupt(self, signum, frame):
+        self.shutdown()
         exit()
 
+    def shutdown(self):
+        self.engine.shutdown()
+        if self.analysis_cache is not None:
+            self.analysis_cache.close()
+        if self.opening_book is not None:
+            self.opening_book.close()
+
     @staticmethod
     def yes_no_prompt(message):
         res = input(message + " (y/n) ")
@@ -233,7 +333,102 @@ class Game:
                         + ("+inf" if upper_bound is None else str(upper_bound)) + ": ")
 
 
+# Reads the engine settings from the "ENGINE" section of the config into the game or into the settings of one side
+# of a tournament
+def read_engine_config(settings, section):
+    backend = section.get("backend", "bitboard")
+    if backend in BOARD_BACKENDS:
+        settings.board_class = BOARD_BACKENDS[backend]
+
+    table_size_mb = section.getfloat("tt_size_mb", settings.table_size_mb)
+    if table_size_mb > 0:
+        settings.table_size_mb = table_size_mb
+
+    # Seconds per computer move, 0 searches to the fixed depth instead
+    move_time = section.getfloat("move_time", settings.move_time)
+    if move_time >= 0:
+        settings.move_time = move_time
+
+    search_depth = section.getint("search_depth", settings.search_depth)
+    if search_depth > 0:
+        settings.search_depth = search_depth
+
+    # Static evaluation with the distances ignoring walls ("distance") or the shortest path lengths ("path")
+    evaluation = section.get("evaluation", "distance")
+    if evaluation in ("distance", "path"):
+        settings.path_evaluation = evaluation == "path"
+
+    # Print the search counters and phase times of every computer move
+    settings.instrumented = section.getboolean("instrumentation", settings.instrumented)
+
+    # Search the expected reply while a human thinks
+    settings.ponder = section.getboolean("ponder", settings.ponder)
+
+    # Split the root moves between the search processes ("root") or search the whole tree in every process
+    # with a shared transposition table ("smp")
+    parallel = section.get("parallel", settings.parallel)
+    if parallel in ("root", "smp"):
+        settings.parallel = parallel
+
+    processes = section.getint("processes", settings.processes)
+    if processes >= 0:
+        settings.processes = processes
+
+    workers = section.get("workers", settings.workers)
+    if workers in ("processes", "threads"):
+        settings.workers = workers
+
+    # Plain alpha-beta ("alphabeta") or principal variation search with aspiration windows ("pvs")
+    search_algorithm = section.get("search", settings.search_algorithm)
+    if search_algorithm in ("alphabeta", "pvs"):
+        settings.search_algorithm = search_algorithm
+
+    aspiration_window = section.getfloat("aspiration_window", settings.aspiration_window)
+    if aspiration_window > 0:
+        settings.aspiration_window = aspiration_window
+
+    # Moves searched to the full depth before the later ones are reduced by the late move reduction
+    full_depth_moves = section.getint("full_depth_moves", settings.full_depth_moves)
+    if full_depth_moves > 0:
+        settings.full_depth_moves = full_depth_moves
+
+    late_move_reduction = section.getint("late_move_reduction", settings.late_move_reduction)
+    if late_move_reduction >= 0:
+        settings.late_move_reduction = late_move_reduction
+
+    # Late moves of the nodes up to the depth are pruned when their static evaluation is worse than the bound
+    # by the margin per ply
+    late_move_pruning_depth = section.getint("late_move_pruning_depth", settings.late_move_pruning_depth)
+    if late_move_pruning_depth >= 0:
+        settings.late_move_pruning_depth = late_move_pruning_depth
+
+    late_move_margin = section.getfloat("late_move_margin", settings.late_move_margin)
+    if late_move_margin >= 0:
+        settings.late_move_margin = late_move_margin
+
+    # Cut nodes off when passing the turn fails high in a search reduced by the null move reduction
+    settings.null_move = section.getboolean("null_move", settings.null_move)
+
+    null_move_reduction = section.getint("null_move_reduction", settings.null_move_reduction)
+    if null_move_reduction >= 0:
+        settings.null_move_reduction = null_move_reduction
+
+    # Solve races exactly once neither player has walls left
+    settings.race_solver = section.getboolean("race_solver", settings.race_solver)
+
+    # Searches of earlier runs kept in a file, up to the number of positions
+    settings.analysis_cache_path = section.get("analysis_cache", settings.analysis_cache_path)
+
+    analysis_cache_entries = section.getint("analysis_cache_entries", settings.analysis_cache_entries)
+    if analysis_cache_entries > 0:
+        settings.analysis_cache_entries = analysis_cache_entries
+
+    # Opening book played without searching
+    settings.opening_book_path = section.get("opening_book", settings.opening_book_path)
+
+
 if __name__ == "__main__":
     g = Game()
     g.setup()
     g.run()
+    g.shutdown()
@@ -1,26 +1,71 @@
 from re import fullmatch
-from copy import deepcopy
-from itertools import product, chain, repeat, islice
-import heapq
-from math import inf
+from math import inf, nextafter
 import multiprocessing
+from multiprocessing.pool import ThreadPool
+from time import time
 from timeit import default_timer
 
 from board import Board
+from instrumentation import merge_stats
+from race import is_race, race_solver
+from search import late_move_reduction, legal_board_moves, SearchOptions, SearchTimeout, MAX_SEARCH_DEPTH
 
 
+# The walls left to the players and the side to move are kept by the board, players only choose the moves
 class Player:
-    def __init__(self, player, walls, game):
+    def __init__(self, player, game):
         self.player = player
-        self.vertical_walls = walls
-        self.horizontal_walls = walls
         self.game = game
         self.profiling = True
-
-    def print_player_info(self):
+        # Size of the transposition table of every search process
+        self.table_size_mb = 32
+        # Name of the transposition table, players with different engine settings use different tables
+        self.table_name = None
+        # Seconds the computer can spend on a move, if it's 0 the search is limited by search_depth instead
+        self.move_time = 0
+        # Number of plies searched from the root when there's no time limit
+        self.search_depth = 3
+        # Transposition table counters summed over the child processes of the last computer move
+        self.transposition_stats = {}
+        # Count nodes, cutoffs and path checks and time the phases of the search, which is off by default since
+        # the search only has to check for missing stats when it is
+        self.instrumented = False
+        # Search stats summed over the child processes of the last computer move when instrumented
+        self.move_stats = {}
+        # Search the expected reply of a human opponent while they think
+        self.ponder = True
+        # Opponent's reply in the principal variation of the last computer move
+        self.expected_reply = None
+        # Hash, version and pending root moves and results of the search started while pondering
+        self.pondering = None
+        # Split the root moves between the engine processes ("root") or let every process search the whole tree
+        # with a shared transposition table ("smp")
+        self.parallel = "root"
+        # Plain alpha-beta ("alphabeta") or principal variation search ("pvs") with aspiration windows of the width
+        self.search_algorithm = "alphabeta"
+        self.aspiration_window = 0.25
+        # Selectivity of the search: moves searched to the full depth before the later ones are reduced and by how
+        # many plies, up to which depth late moves are pruned by their static evaluation and with what margin per
+        # ply, and whether nodes are cut off by passing the turn
+        self.full_depth_moves = 4
+        self.late_move_reduction = 2
+        self.late_move_pruning_depth = 2
+        self.late_move_margin = 0.25
+        self.null_move = True
+        self.null_move_reduction = 2
+        # Solve races exactly once neither player has walls left instead of searching them
+        self.race_solver = True
+
+    def search_options(self):
+        return SearchOptions(self.instrumented, self.search_algorithm, self.aspiration_window, self.full_depth_moves,
+                             self.late_move_reduction, self.late_move_pruning_depth, self.late_move_margin,
+                             self.null_move, self.null_move_reduction)
+
+    def print_player_info(self, board):
+        vertical_walls, horizontal_walls = board.walls_left[self.player]
         print(f"Playing: {self.__class__.__name__} '{self.player}'")
-        print(f"Vertical walls: {self.vertical_walls}")
-        print(f"Horizontal walls: {self.horizontal_walls}")
+        print(f"Vertical walls: {vertical_walls}")
+        print(f"Horizontal walls: {horizontal_walls}")
 
     def print_winner(self, moves):
         print('-' * 50)
@@ -32,614 +77,324 @@ class Player:
     def get_move(self, board):
         pass
 
-    def get_computer_move(self, board):
+    # Searches with iterative deepening until the search depth is reached or the time budget runs out, in which case
+    # the best move of the last completed iteration is returned. The first iteration is always completed
+    def get_computer_move(self, board, time_budget=None):
         start = None
         if self.profiling:
             start = default_timer()
 
-        moves = self.legal_board_moves(board, all_moves=False)
+        moves = legal_board_moves(board)
         if len(moves) == 0:
             return None
 
-        # Spawn child processes for as many moves
-        with multiprocessing.Pool() as pool:
-            evaluations = pool.starmap(self.minimax_caller, zip(repeat(board), moves))
+        if time_budget is None:
+            time_budget = self.move_time
+        deadline = time() + time_budget if time_budget else None
+
+        self.transposition_stats = {}
+        self.move_stats = {}
+
+        # Races that are solved don't need a search
+        race = race_solver(board).solve(board) if self.race_solver and is_race(board) else None
+        if race is not None:
+            evaluation, move, race_moves = race
+            if start is not None:
+                print(f"Computer move time: {default_timer() - start}")
+                print(f"Race solved: {'won' if (evaluation == inf) == (self.player == 'X') else 'lost'} "
+                      f"in {race_moves} moves")
+
+            self.expected_reply = None
+            return move
+
+        # Book moves are played right away
+        opening_book = self.game.opening_book
+        book_entry = opening_book.lookup(board) if opening_book is not None else None
+        if book_entry is not None and book_entry[1] in moves:
+            if start is not None:
+                print(f"Computer move time: {default_timer() - start}")
+                print(f"Book move, evaluation: {book_entry[0]}")
+
+            self.expected_reply = None
+            return book_entry[1]
+
+        # Positions searched to the depth in an earlier run are taken from the analysis cache, which only keeps
+        # legal moves unless two positions share the hash
+        analysis_cache = self.game.analysis_cache
+        search = analysis_cache.lookup(board, self.search_depth) if analysis_cache is not None else None
+        if search is not None and search[2] not in moves:
+            search = None
+
+        if search is not None:
+            if start is not None:
+                print("Analysis cache hit")
+        elif self.parallel == "smp":
+            search = self.search_shared_tree(board, moves, deadline)
+        else:
+            search = self.search_split_root(board, moves, deadline)
+        completed_depth, best_evaluation, best_move, principal_variation = search
 
-        best_evaluation, best_move = \
-            max(zip(evaluations, moves)) if self.player == 'X' else min(zip(evaluations, moves))
+        if analysis_cache is not None and completed_depth:
+            analysis_cache.store(board, completed_depth, best_evaluation, best_move, principal_variation)
 
         if start is not None:
             print(f"Computer move time: {default_timer() - start}")
+            print(f"Search depth: {completed_depth}, evaluation: {best_evaluation}")
+            print(f"Transposition table: {self.transposition_stats}")
+            if self.instrumented:
+                print(f"Search: {self.move_stats}")
 
-        return best_move
-
-    # Plays the move on a new board state which it returns after updating the number of player walls if update_walls
-    def play_move(self, board, move, update_walls=True):
-        new_board = deepcopy(board)
-
-        self.in_place_play_move(new_board, move, update_walls)
-
-        return new_board
-
-    def in_place_play_move(self, board, move, update_walls=True, undo=False):
-        undo_move = board.move_pawn(*(move[0]))
-
-        if len(move) == 2:
-            board.place_wall(*(move[1]))
-
-            # Update the number of walls
-            if update_walls:
-                if move[1][0] == 'Z':
-                    self.vertical_walls += 1 if undo else -1
-                else:
-                    self.horizontal_walls += 1 if undo else -1
-
-            return board, (undo_move, (*(move[1]), not undo)), update_walls, not undo
-
-        return board, (undo_move,), update_walls, not undo
-
-    def iter_next_legal_board_states(self, board, moves=None):
-        return map(lambda move: self.play_move(board, move, update_walls=False),
-                   self.legal_board_moves(board) if moves is None else moves)
-
-    def legal_board_moves(self, board, all_moves=True):
-        if self.vertical_walls > 0 or self.horizontal_walls > 0:
-            return self.legal_pawn_wall_move_combinations(board, self.legal_pawn_moves(board, all_moves=all_moves),
-                                                          self.legal_wall_placements(board, all_moves=all_moves))
-        else:
-            return tuple(map(lambda move: (move,), self.legal_pawn_moves(board)))
-
-    def legal_pawn_moves(self, board, all_moves=True):
-        pawns = board.player_1_pawns if self.player == 'X' else board.player_2_pawns
-        pawn_moves = tuple(chain(
-            map(lambda l: (self.player, 0, *l), self.iter_legal_jumps(board, pawns[0][0], pawns[0][1])),
-            map(lambda l: (self.player, 1, *l), self.iter_legal_jumps(board, pawns[1][0], pawns[1][1]))
-        ))
-
-        # Sort pawn moves by static evaluation
-        static_evaluations = [0] * len(pawn_moves)
-        for i, pawn_move in enumerate(pawn_moves):
-            undo_move = board.move_pawn(*pawn_move)
-
-            static_evaluations[i] = board.static_evaluation()
-
-            board.move_pawn(*undo_move)
-        pawn_moves = tuple(pawn_move for _, pawn_move in sorted(zip(static_evaluations, pawn_moves),
-                                                                reverse=self.player == 'X')
-                           )
-
-        return pawn_moves if all_moves else \
-            tuple(chain(
-                islice(filter(lambda move: move[1] == 0, pawn_moves), 2),
-                islice(filter(lambda move: move[1] == 1, pawn_moves), 2)
-            ))
-
-    # Returns all legal pawn jumps from the square with the row and column
-    def iter_legal_jumps(self, board, row, column):
-        source_square = board.board[row][column]
-
-        # Top-side
-        if row > 0:
-            # Top-Left
-            if column > 0 and \
-                    not source_square.top_left() and \
-                    not board.board[row - 1][column - 1].bottom_right() and \
-                    not (source_square.left and board.board[row - 1][column].left) and \
-                    not (source_square.top and board.board[row][column - 1].top) and \
-                    (
-                            (board.board[row - 1][column - 1].starting is not None and
-                             board.board[row - 1][column - 1].starting != self.player) or
-                            (board.board[row - 1][column - 1].center != 'X' and
-                             board.board[row - 1][column - 1].center != 'O')
-                    ):
-                yield row - 1, column - 1
-
-            # Top-Right
-            if column < board.columns - 1 and \
-                    not source_square.top_right() and \
-                    not board.board[row - 1][column + 1].bottom_left() and \
-                    not (source_square.right and board.board[row - 1][column].right) and \
-                    not (source_square.top and board.board[row][column + 1].top) and \
-                    (
-                            (board.board[row - 1][column + 1].starting is not None and
-                             board.board[row - 1][column + 1].starting != self.player) or
-                            (board.board[row - 1][column + 1].center != 'X' and
-                             board.board[row - 1][column + 1].center != 'O')
-                    ):
-                yield row - 1, column + 1
-
-            # Top
-            if not source_square.top:
-                # Top-Short
-                if (board.board[row - 1][column].starting is not None and
-                    board.board[row - 1][column].starting != self.player) or \
-                        (
-                                board.board[row - 1][column].center != 'X' and
-                                board.board[row - 1][column].center != 'O' and
-                                (
-                                        row > 1 and
-                                        not board.board[row - 1][column].top and
-                                        (board.board[row - 2][column].center == 'X' or
-                                         board.board[row - 2][column].center == 'O')
-                                )
-                        ):
-                    yield row - 1, column
-
-                # Top-Long
-                if row > 1 and \
-                        not board.board[row - 1][column].top and \
-                        (
-                                (board.board[row - 2][column].starting is not None and
-                                 board.board[row - 2][column].starting != self.player) or
-                                (board.board[row - 2][column].center != 'X' and
-                                 board.board[row - 2][column].center != 'O')
-                        ):
-                    yield row - 2, column
-
-        # Bottom-side
-        if row < board.rows - 1:
-            # Bottom-Left
-            if column > 0 and \
-                    not source_square.bottom_left() and \
-                    not board.board[row + 1][column - 1].top_right() and \
-                    not (source_square.left and board.board[row + 1][column].left) and \
-                    not (source_square.bottom and board.board[row][column - 1].bottom) and \
-                    (
-                            (board.board[row + 1][column - 1].starting is not None and
-                             board.board[row + 1][column - 1].starting != self.player) or
-                            (board.board[row + 1][column - 1].center != 'X' and
-                             board.board[row + 1][column - 1].center != 'O')
-                    ):
-                yield row + 1, column - 1
-
-            # Bottom-Right
-            if column < board.columns - 1 and \
-                    not source_square.bottom_right() and \
-                    not board.board[row + 1][column + 1].top_left() and \
-                    not (source_square.right and board.board[row + 1][column].right) and \
-                    not (source_square.bottom and board.board[row][column + 1].bottom) and \
-                    (
-                            (board.board[row + 1][column + 1].starting is not None and
-                             board.board[row + 1][column + 1].starting != self.player) or
-                            (board.board[row + 1][column + 1].center != 'X' and
-                             board.board[row + 1][column + 1].center != 'O')
-                    ):
-                yield row + 1, column + 1
-
-            # Bottom
-            if not source_square.bottom:
-                # Bottom-Short
-                if (board.board[row + 1][column].starting is not None and
-                    board.board[row + 1][column].starting != self.player) or \
-                        (
-                                board.board[row + 1][column].center != 'X' and
-                                board.board[row + 1][column].center != 'O' and
-                                (
-                                        row < board.rows - 2 and
-                                        not board.board[row + 1][column].bottom and
-                                        (board.board[row + 2][column].center == 'X' or
-                                         board.board[row + 2][column].center == 'O')
-                                )
-                        ):
-                    yield row + 1, column
-
-                # Bottom-Long
-                if row < board.rows - 2 and \
-                        not board.board[row + 1][column].bottom and \
-                        (
-                                (board.board[row + 2][column].starting is not None and
-                                 board.board[row + 2][column].starting != self.player) or
-                                (board.board[row + 2][column].center != 'X' and
-                                 board.board[row + 2][column].center != 'O')
-                        ):
-                    yield row + 2, column
-
-        # Left
-        if column > 0 and not source_square.left:
-            if (board.board[row][column - 1].starting is not None and
-                board.board[row][column - 1].starting != self.player) or \
-                    (
-                            board.board[row][column - 1].center != 'X' and
-                            board.board[row][column - 1].center != 'O' and
-                            (
-                                    column > 1 and
-                                    not board.board[row][column - 1].left and
-                                    (board.board[row][column - 2].center == 'X' or
-                                     board.board[row][column - 2].center == 'O')
-                            )
-                    ):
-                yield row, column - 1
-
-            # Left-Long
-            if column > 1 and \
-                    not board.board[row][column - 1].left and \
-                    (
-                            (board.board[row][column - 2].starting is not None and
-                             board.board[row][column - 2].starting != self.player) or
-                            (board.board[row][column - 2].center != 'X' and
-                             board.board[row][column - 2].center != 'O')
-                    ):
-                yield row, column - 2
-
-        # Right
-        if column < board.columns - 1 and not source_square.right:
-            # Right-Short
-            if (board.board[row][column + 1].starting is not None and
-                board.board[row][column + 1].starting != self.player) or \
-                    (
-                            board.board[row][column + 1].center != 'X' and
-                            board.board[row][column + 1].center != 'O' and
-                            (
-                                    column < board.columns - 2 and
-                                    not board.board[row][column + 1].right and
-                                    (board.board[row][column + 2].center == 'X' or
-                                     board.board[row][column + 2].center == 'O')
-                            )
-                    ):
-                yield row, column + 1
-
-            # Right-Long
-            if column < board.columns - 2 and \
-                    not board.board[row][column + 1].right and \
-                    (
-                            (board.board[row][column + 2].starting is not None and
-                             board.board[row][column + 2].starting != self.player) or
-                            (board.board[row][column + 2].center != 'X' and
-                             board.board[row][column + 2].center != 'O')
-                    ):
-                yield row, column + 2
-
-    def legal_wall_placements(self, board, all_moves=True):
-        wall_moves = []
-
-        for row in range(board.rows - 1):
-            for column in range(board.columns - 1):
-                if self.vertical_walls > 0:
-                    if board.valid_wall_placement('Z', row, column, print_failure=False):
-                        wall_moves.append(('Z', row, column))
-
-                if self.horizontal_walls > 0:
-                    if board.valid_wall_placement('P', row, column, print_failure=False):
-                        wall_moves.append(('P', row, column))
-
-        # Sort wall moves adjacent to starting square or closest enemy pawns
-        starting = board.player_1_start if self.player == 'X' else board.player_2_start
-
-        wall_moves.sort(key=lambda move:
-                        min(board.non_diagonal_distance((move[1], move[2]), starting[0]),
-                            board.non_diagonal_distance((move[1], move[2]), starting[1])))
-
-        return wall_moves if all_moves else \
-            tuple(islice(wall_moves,
-                         (board.num_placed_walls // 3
-                          if board.num_placed_walls < 9 else
-                          (board.num_placed_walls // 6 + 1))
-                         * board.num_placed_walls + 8))
-
-    # Find all move combinations that don't block any one of the pawns' path to the goal
-    @staticmethod
-    def legal_pawn_wall_move_combinations(board, pawn_moves, wall_moves):
-        player = pawn_moves[0][0]
-
-        # TODO: Change algorithm to use a search tree and process all pawn moves at the same time
-        moves = []
-
-        # Walls not touching any walls on their ends cannot block a path
-        skip_check_set = {
-            wall_move for wall_move in wall_moves
-            if (wall_move[0] == 'Z' and wall_move[1] != 0 and
-                not board.board[wall_move[1]][wall_move[2]].top and
-                not board.board[wall_move[1]][wall_move[2] + 1].top and
-                wall_move[1] != board.rows - 2 and
-                not board.board[wall_move[1] + 1][wall_move[2]].bottom and
-                not board.board[wall_move[1] + 1][wall_move[2] + 1].bottom)
-            or
-               (wall_move[0] == 'P' and wall_move[2] != 0 and
-                not board.board[wall_move[1]][wall_move[2]].left and
-                not board.board[wall_move[1] + 1][wall_move[2]].left and
-                wall_move[2] != board.columns - 2 and
-                not board.board[wall_move[1]][wall_move[2] + 1].right and
-                not board.board[wall_move[1] + 1][wall_move[2] + 1].right)
-        }
-
-        # Filter out walls that block the path of the opponents pawns
-        wall_moves = Player.filter_blocking_walls(board, 'O' if player == 'X' else 'X', wall_moves,
-                                                  skip_check_set=skip_check_set)
-
-        # Walls that don't block the first and second pawn at their base position
-        non_pawn_blocking = (Player.filter_blocking_walls(board, player, wall_moves, only_pawn_index=0,
-                                                          skip_check_set=skip_check_set),
-                             Player.filter_blocking_walls(board, player, wall_moves, only_pawn_index=1,
-                                                          skip_check_set=skip_check_set))
-
-        for pawn_move in pawn_moves:
-            undo_move = board.move_pawn(*pawn_move)
-
-            new_wall_moves = Player.filter_blocking_walls(board, player, non_pawn_blocking[(pawn_move[1] + 1) % 2],
-                                                          only_pawn_index=pawn_move[1], skip_check_set=skip_check_set)
-
-            board.move_pawn(*undo_move)
-
-            moves += product((pawn_move,), new_wall_moves)
-
-        return moves
-
-    # Returns a filtered list of wall moves that don't block the path of the given player's pawns
-    # The algorithm tries to find two non-adjacent paths for every path that needs to be checked.
-    # If found, both of the paths cannot be blocked, so path-checking for that path is excluded.
-    # If not, it tests if any of the walls obstruct the path and then tries to reconstruct it
-    @staticmethod
-    def filter_blocking_walls(board, player, wall_moves, only_pawn_index=None, skip_check_set=None):
-        if player == 'X':
-            pawns = board.player_1_pawns
-            goals = board.player_2_start
-        else:
-            pawns = board.player_2_pawns
-            goals = board.player_1_start
-
-        # Try to find two non-adjacent paths from each start to each pawn
-        paths = [True] * 4
-        for pawn_index in range(2):
-            if only_pawn_index is not None and pawn_index != only_pawn_index:
-                continue
-
-            for goal_index in range(2):
-                path, jump_filter = \
-                    Player.find_non_adjacent_paths(board, pawns[pawn_index], goals[goal_index])
-                new_path, _ = \
-                    Player.find_non_adjacent_paths(board, pawns[pawn_index], goals[goal_index], jump_filter=jump_filter)
-
-                # If two paths are found blocking both the paths is impossible otherwise it is possible
-                if type(new_path) is not dict:
-                    paths[pawn_index * 2 + goal_index] = path
-
-        # Check if there are is no way to block any of the paths
-        if paths == [True, True, True, True]:
-            return wall_moves
-
-        # Test if any of the walls obstructs the paths and reconstruct the path if necessary
-        filtered_wall_moves = []
-        for wall_move in wall_moves:
-            if skip_check_set is not None and wall_move in skip_check_set:
-                filtered_wall_moves.append(wall_move)
-                continue
-
-            legal = True
-            board.place_wall(*wall_move)
-
-            for index, path in enumerate(paths):
-                if type(path) is dict:
-                    # Check for parts of the path that need to be reconstructed
-                    first_affected_square = (inf, None)
-                    last_affected_square = (-inf, None)
-                    for potential_square in Player.iter_wall_placement_affected_squares(board, *wall_move):
-                        if potential_square in path and path[potential_square][1] not in \
-                                board.iter_non_blocking_jumps(potential_square[0], potential_square[1]):
-                            if first_affected_square[0] > path[potential_square][0]:
-                                first_affected_square = (path[potential_square][0], potential_square)
-                            last_affected_square = max(last_affected_square, path[potential_square])
-
-                    # Check if the path can be reconstructed
-                    if first_affected_square[1] is not None and \
-                            not board.check_path(first_affected_square[1], last_affected_square[1]):
-                        legal = False
-                        break
-
-            board.place_wall(*wall_move, lift=True)
-            if legal:
-                filtered_wall_moves.append(wall_move)
-
-        return filtered_wall_moves
-
-    @staticmethod
-    def find_non_adjacent_paths(board, source, destination, jump_filter=None):
-        if source[0] == destination[0] and source[1] == destination[1]:
-            return {}, set() if jump_filter is None else None
-
-        # Dictionary for keeping track of the path
-        prev_jump = {(source[0], source[1]): None}
-
-        prio_queue = [(board.non_diagonal_distance(source, destination), *source)]
-        while len(prio_queue):
-            # noinspection PyTupleAssignmentBalance
-            _, row, column = heapq.heappop(prio_queue)
-            pos = (row, column)
-
-            if row == destination[0] and column == destination[1]:
-                break
-
-            for new_pos in filter(
-                    lambda jump: jump not in prev_jump and (jump_filter is None or jump not in jump_filter),
-                    board.iter_non_blocking_jumps(row, column)):
-                prev_jump[new_pos] = pos
-                heapq.heappush(prio_queue, (board.non_diagonal_distance(new_pos, destination), *new_pos))
-
-        # Check if a path is found
-        if (destination[0], destination[1]) not in prev_jump:
-            return False, set() if jump_filter is None else None
+        self.expected_reply = principal_variation[0] if principal_variation else None
 
-        # Prep for filling the filter if needed
-        new_jump_filter = set() if jump_filter is None else None
-
-        # Trace the path along with the order of nodes
-        ordered_path = dict()
-        order = 0
-        current = (destination[0], destination[1])
-        while current[0] != source[0] or current[1] != source[1]:
-            ordered_path[current] = (order, prev_jump[current])
-
-            # Fill out the filter
-            if new_jump_filter is not None:
-                for adjacent_square in Player.iter_adjacent_squares_from_jump(board, current, prev_jump[current]):
-                    new_jump_filter.add(adjacent_square)
-
-            current = prev_jump[current]
-            order += 1
-
-        if new_jump_filter is not None:
-            new_jump_filter.remove((source[0], source[1]))
-            new_jump_filter.remove((destination[0], destination[1]))
-
-        return ordered_path, new_jump_filter
+        return best_move
 
-    # Returns all the squares that cannot be jumped to in order for the paths to be non-adjacent
-    @staticmethod
-    def iter_adjacent_squares_from_jump(board, prev_pos, pos, include_jump_squares=True):
-        if include_jump_squares:
-            yield prev_pos
-            yield pos
-
-        # Top-side
-        if prev_pos[0] > pos[0]:
-            # Top-Middle
-            if prev_pos[1] == pos[1]:
-                if pos[1] > 0:
-                    yield pos[0], pos[1] - 1
-                    yield prev_pos[0], prev_pos[1] - 1
-                if pos[1] < board.columns - 1:
-                    yield pos[0], pos[1] + 1
-                    yield prev_pos[0], prev_pos[1] + 1
-
-            # Top-Left
-            elif prev_pos[1] > pos[1]:
-                yield pos[0], pos[1] + 1
-                yield pos[0] + 1, pos[1]
-                if pos[0] > 0:
-                    yield pos[0] - 1, pos[1] + 1
-                if pos[1] > 0:
-                    yield pos[0] + 1, pos[1] - 1
-                if prev_pos[0] < board.rows - 1:
-                    yield prev_pos[0] + 1, prev_pos[1] - 1
-                if prev_pos[1] < board.columns - 1:
-                    yield prev_pos[0] - 1, prev_pos[1] + 1
-
-            # Top-Right
+    # Searches every root move in a task of its own in each iteration. Returns the completed depth, the evaluation,
+    # the best move and the principal variation after it
+    def search_split_root(self, board, moves, deadline):
+        best_evaluation, best_move = None, moves[0]
+        principal_variation = ()
+        completed_depth = 0
+
+        # The search of the position may have been done while pondering, which leaves only the last iteration
+        pondered_results = self.pondered_results(board, deadline)
+        first_depth = 1
+        if pondered_results is not None:
+            moves, pondered_results = pondered_results
+            first_depth = self.search_depth
+            if self.profiling:
+                print("Ponder hit")
+
+        # The position is published to the engine processes once and the root moves are referred to by index
+        engine = self.game.engine
+        version = engine.publish(board, self, moves) if pondered_results is None else None
+        move_indices = {move: index for index, move in enumerate(moves)}
+        options = self.search_options()
+
+        for depth in range(first_depth, (MAX_SEARCH_DEPTH if deadline else self.search_depth) + 1):
+            # Iterations of principal variation search after the first search every root move within the
+            # aspiration window around the last evaluation
+            window = (-inf, inf)
+            if self.search_algorithm == "pvs" and best_evaluation is not None:
+                window = (best_evaluation - self.aspiration_window, best_evaluation + self.aspiration_window)
+
+            # Every root move is searched, ordered by the evaluations of the last iteration
+            if depth == first_depth and pondered_results is not None:
+                results = pondered_results
             else:
-                yield pos[0], pos[1] - 1
-                yield pos[0] + 1, pos[1]
-                if pos[0] > 0:
-                    yield pos[0] - 1, pos[1] - 1
-                if pos[1] < board.columns - 1:
-                    yield pos[0] + 1, pos[1] + 1
-                if prev_pos[0] < board.rows - 1:
-                    yield prev_pos[0] + 1, prev_pos[1] + 1
-                if prev_pos[1] > 0:
-                    yield prev_pos[0] - 1, prev_pos[1] - 1
-
-        # Middle
-        elif prev_pos[0] == pos[0]:
-            # Left and Right
-            if pos[0] > 0:
-                yield pos[0] - 1, pos[1]
-                yield prev_pos[0] - 1, prev_pos[1]
-            if pos[0] < board.rows - 1:
-                yield pos[0] + 1, pos[1]
-                yield prev_pos[0] + 1, prev_pos[1]
-
-        # Bottom-side
-        else:
-            # Since the edges are undirected the bottom side is symmetrical to the top side
-            yield from Player.iter_adjacent_squares_from_jump(board, pos, prev_pos, include_jump_squares=False)
-
-    # Returns all squares whose non-blocking jumps may be changed if a given wall is placed
-    @staticmethod
-    def iter_wall_placement_affected_squares(board, wall_type, row, column):
-        yield row, column
-        yield row, column + 1
-        yield row + 1, column
-        yield row + 1, column + 1
-
-        if wall_type == 'Z':
-            if row > 0:
-                yield row - 1, column
-                yield row - 1, column + 1
-
-            if row < board.rows - 2:
-                yield row + 2, column
-                yield row + 2, column + 1
-        else:
-            if column > 0:
-                yield row, column - 1
-                yield row + 1, column - 1
-
-            if column < board.columns - 2:
-                yield row, column + 2
-                yield row + 1, column + 2
-
-    def minimax(self, board, depth, alpha, beta):
-        if depth == 0 or board.game_end():
-            return board.static_evaluation()
-
-        no_legal_moves = True
-
-        if self.player == 'X':
-            opponent = self.game.player_2
-
-            max_eval = -inf
-            for move in self.legal_board_moves(board, all_moves=False):
-                no_legal_moves = False
-
-                undo_move = self.in_place_play_move(board, move)
-
-                evaluation = opponent.minimax(board, depth - 1, alpha, beta)
-                max_eval = max(max_eval, evaluation)
-
-                self.in_place_play_move(*undo_move)
-
-                # Alpha cut off
-                alpha = max(alpha, evaluation)
-                if beta <= alpha:
+                try:
+                    results = self.search_iteration(version, moves, move_indices, depth, deadline, best_move,
+                                                    principal_variation, options, window)
+                except (SearchTimeout, multiprocessing.TimeoutError):
                     break
 
-            return 0 if no_legal_moves else max_eval
-        else:
-            opponent = self.game.player_1
-
-            min_eval = inf
-            for move in self.legal_board_moves(board, all_moves=False):
-                no_legal_moves = False
-
-                undo_move = self.in_place_play_move(board, move)
+            # The evaluation of the best move is only a bound when it falls outside the window, then the iteration
+            # is repeated with the full window
+            evaluations = [evaluation for evaluation, _, _, _ in results]
+            best = max(evaluations) if self.player == 'X' else min(evaluations)
+            if not window[0] < best < window[1] and window != (-inf, inf):
+                self.merge_result_stats(results)
+                if self.instrumented:
+                    merge_stats(self.move_stats, {"aspiration re-searches": 1})
+                try:
+                    results = self.search_iteration(version, moves, move_indices, depth, deadline, best_move,
+                                                    principal_variation, options)
+                except (SearchTimeout, multiprocessing.TimeoutError):
+                    break
 
-                evaluation = opponent.minimax(board, depth - 1, alpha, beta)
-                min_eval = min(min_eval, evaluation)
+            self.merge_result_stats(results)
+            evaluations = [evaluation for evaluation, _, _, _ in results]
+            best_evaluation, best_move = \
+                max(zip(evaluations, moves)) if self.player == 'X' else min(zip(evaluations, moves))
+            principal_variation = results[moves.index(best_move)][1]
+            completed_depth = depth
 
-                self.in_place_play_move(*undo_move)
+            moves = self.order_moves(moves, evaluations)
 
-                # Beta cut off
-                beta = min(beta, evaluation)
-                if beta <= alpha:
-                    break
+            # Stop when the game is decided or there's no time left
+            if abs(best_evaluation) == inf or (deadline is not None and time() >= deadline):
+                break
 
-            return 0 if no_legal_moves else min_eval
+        return completed_depth, best_evaluation, best_move, principal_variation
+
+    # Orders the root moves for the next iteration by their evaluations, followed by the ones left unsearched after
+    # a win
+    def order_moves(self, moves, evaluations):
+        return [move for _, move in sorted(zip(evaluations, moves), key=lambda pair: pair[0],
+                                           reverse=self.player == 'X')] + list(moves[len(evaluations):])
+
+    # Searches the root moves of the iteration to the depth like principal variation search does at the root: the
+    # first move within the window and the others with a null window at its evaluation, which only tells whether
+    # they are better. Late moves are reduced like in search_root and searched to the full depth when they turn out
+    # better, then the better ones get searched again within the window above the first move. Returns the results
+    # of the moves, only of the first one when it wins or falls outside the window, or None results if a newer
+    # position was published
+    def search_iteration(self, version, moves, move_indices, depth, deadline, best_move, principal_variation,
+                         options, window=(-inf, inf)):
+        results = self.search_root_moves(version, moves[:1], move_indices, depth, deadline, best_move,
+                                         principal_variation, options, window)
+        evaluation = results[0] and results[0][0]
+        if results[0] is None or len(moves) == 1 or evaluation == (inf if self.player == 'X' else -inf) or \
+                not window[0] < evaluation < window[1] and window != (-inf, inf):
+            return results
+
+        null_window = (evaluation, nextafter(evaluation, inf)) if self.player == 'X' else \
+            (nextafter(evaluation, -inf), evaluation)
+        reduction = late_move_reduction(options, depth, options.full_depth_moves + 1)
+        late = max(options.full_depth_moves, 1) if reduction else len(moves)
+        searches = [self.start_root_moves(version, batch, move_indices, batch_depth, deadline, best_move,
+                                          principal_variation, options, null_window)
+                    for batch, batch_depth in ((moves[1:late], depth), (moves[late:], depth - reduction)) if batch]
+        for search in searches:
+            results += self.root_move_results(search, depth, deadline)
+
+        # Reduced moves that turn out better are searched to the full depth with the null window first, the ones
+        # still better within the window above the first move
+        for searched, search_window in ((range(late, len(moves)), null_window),
+                                        (range(1, len(moves)), (evaluation, window[1]) if self.player == 'X' else
+                                         (window[0], evaluation))):
+            if None in results:
+                return results
+
+            better = [index for index in searched if
+                      (results[index][0] > evaluation if self.player == 'X' else results[index][0] < evaluation)]
+            if not better:
+                continue
 
-    # Helper function that the child processes call; plays the move on the board and calls minimax
-    def minimax_caller(self, board, move):
-        undo_move = self.in_place_play_move(board, move)
+            self.merge_result_stats([results[index] for index in better])
+            if self.instrumented:
+                merge_stats(self.move_stats, {"root re-searches": len(better)})
+
+            for index, result in zip(better, self.search_root_moves(
+                    version, [moves[index] for index in better], move_indices, depth, deadline, best_move,
+                    principal_variation, options, search_window)):
+                results[index] = result
+
+        return results
+
+    # Searches the root moves of the iteration to the depth within the window and waits for the results. The best
+    # move is searched first along the principal variation of the last iteration
+    def search_root_moves(self, version, moves, move_indices, depth, deadline, best_move, principal_variation,
+                          options, window=(-inf, inf)):
+        return self.root_move_results(self.start_root_moves(version, moves, move_indices, depth, deadline, best_move,
+                                                            principal_variation, options, window), depth, deadline)
+
+    # Starts the search of the root moves to the depth within the window in the engine
+    def start_root_moves(self, version, moves, move_indices, depth, deadline, best_move, principal_variation,
+                         options, window=(-inf, inf)):
+        return self.game.engine.search(version, [move_indices[move] for move in moves], depth - 1,
+                                       deadline if depth > 1 else None,
+                                       [principal_variation if move == best_move else () for move in moves],
+                                       options, window)
+
+    # Waits for the results of the root moves of the iteration to the depth
+    def root_move_results(self, async_results, depth, deadline):
+        return async_results.get(None if depth == 1 or deadline is None else max(deadline - time(), 0) + 1)
+
+    # Adds the counters of the table and the search stats of the results to the ones of the move
+    def merge_result_stats(self, results):
+        for _, _, table_stats, search_stats in results:
+            merge_stats(self.transposition_stats, table_stats)
+            merge_stats(self.move_stats, search_stats)
+
+    # Lazy SMP: every engine process searches the whole tree with iterative deepening and they share one
+    # transposition table. The helpers are stopped once one of them completes the search, then the deepest
+    # completed search is used and the first one to finish among equally deep ones
+    def search_shared_tree(self, board, moves, deadline):
+        engine = self.game.engine
+        version = engine.publish(board, self, moves)
+        depth = MAX_SEARCH_DEPTH if deadline else self.search_depth
+
+        results = []
+        for result in engine.search_tree(version, depth, deadline, self.search_options()):
+            if result is None:
+                continue
 
-        evaluation = self.game.player_2.minimax(board, 2, -inf, inf) if self.player == 'X' else \
-            self.game.player_1.minimax(board, 2, -inf, inf)
+            *search, table_stats, search_stats = result
+            merge_stats(self.transposition_stats, table_stats)
+            merge_stats(self.move_stats, search_stats)
+
+            completed_depth, evaluation, _, _ = search
+            if completed_depth:
+                results.append(search)
+                if completed_depth == depth or abs(evaluation) == inf:
+                    engine.stop(version)
+
+        # Like the split root search, the first move is played when no helper completes an iteration in time
+        return max(results, key=lambda search: search[0], default=(0, None, moves[0], ()))
+
+    # Starts the search of the position after the expected reply of the opponent in the engine processes while
+    # the opponent thinks. Only searches limited by depth that split the root moves are pondered
+    def start_pondering(self, board):
+        self.pondering = None
+        if not self.ponder or self.move_time or self.parallel != "root":
+            return
+
+        replies = legal_board_moves(board)
+        if not replies:
+            return
+        reply = self.expected_reply if self.expected_reply in replies else replies[0]
+
+        board.make_move(reply)
+        try:
+            moves = () if board.game_end() else legal_board_moves(board)
+            if moves:
+                version = self.game.engine.publish(board, self, moves)
+                ponder_pool = ThreadPool(1)
+                self.pondering = board.hash_key, version, ponder_pool.apply_async(self.ponder_position,
+                                                                                  (version, moves))
+                ponder_pool.close()
+        finally:
+            board.unmake_move()
+
+    # Iterative deepening of the pondered position up to the depth of the player. It runs in a thread of its own,
+    # since every iteration waits for its first move. Returns the root moves in the order of the last iteration and
+    # its results
+    def ponder_position(self, version, moves):
+        move_indices = {move: index for index, move in enumerate(moves)}
+        options = self.search_options()
+        best_move, principal_variation = None, ()
+
+        for depth in range(1, self.search_depth + 1):
+            results = self.search_iteration(version, moves, move_indices, depth, None, best_move,
+                                            principal_variation, options)
+            if None in results or depth == self.search_depth:
+                return moves, results
+
+            evaluations = [evaluation for evaluation, _, _, _ in results]
+            _, best_move = max(zip(evaluations, moves)) if self.player == 'X' else min(zip(evaluations, moves))
+            principal_variation = results[moves.index(best_move)][1]
+            moves = self.order_moves(moves, evaluations)
+
+    # Returns the root moves and the results of the pondered search if the opponent played the expected reply
+    # and no other position was published since, otherwise None. Waits for the search to finish
+    def pondered_results(self, board, deadline):
+        pondering, self.pondering = self.pondering, None
+        if pondering is None or deadline is not None:
+            return None
 
-        self.in_place_play_move(*undo_move)
+        hash_key, version, async_result = pondering
+        if hash_key != board.hash_key or version != self.game.engine.sequence:
+            return None
 
-        return evaluation
+        moves, results = async_result.get()
+        return None if None in results else (moves, results)
 
 
 class Computer(Player):
-    def __init__(self, player, walls, game):
-        super().__init__(player, walls, game)
+    def __init__(self, player, game):
+        super().__init__(player, game)
 
     def get_move(self, board):
         return self.get_computer_move(board)
 
 
 class Human(Player):
-    def __init__(self, player, walls, game):
-        super().__init__(player, walls, game)
+    def __init__(self, player, game):
+        super().__init__(player, game)
 
     def get_move(self, board):
         # Check if there are any legal moves
-        if len(self.legal_board_moves(board)) == 0:
+        if len(legal_board_moves(board)) == 0:
             return None
 
         # Ask for input until the move is valid
@@ -680,9 +435,10 @@ class Human(Player):
         if not board.valid_pawn_move(player, pawn_index, pawn_row, pawn_column):
             return False
 
+        vertical_walls, horizontal_walls = board.walls_left[self.player]
         if wall_type is not None:
             # Check if the player has the wall type
-            if (wall_type == 'Z' and self.vertical_walls == 0) or (wall_type == 'P' and self.horizontal_walls == 0):
+            if (wall_type == 'Z' and vertical_walls == 0) or (wall_type == 'P' and horizontal_walls == 0):
                 print("There are no more walls of that type to place!")
                 return False
 
@@ -696,7 +452,7 @@ class Human(Player):
                 return False
 
         # Check if wall can be placed
-        elif self.vertical_walls > 0 or self.horizontal_walls > 0:
+        elif vertical_walls > 0 or horizontal_walls > 0:
             print("You must place a wall!")
             return False
 
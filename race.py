@@ -0,0 +1,298 @@
+from math import inf
+
+# Race solvers of the wall layouts solved last. The walls don't change once both players run out of them, so a game
+# only ever needs one
+race_solvers = {}
+
+# Nodes a solve may visit before it gives the position up to the search
+MAX_RACE_NODES = 50000
+
+
+class RaceSolverLimit(Exception):
+    pass
+
+
+# Exact solver of races, the positions where neither player has walls left and only the pawns move. The jumps of
+# every square and the distances between the squares only depend on the walls, so they are computed once. Squares
+# are indexed by row * columns + column like the bits of the bitboard and side 0 is the first player ('X').
+#
+# A position is solved by a search of whether the side to move wins within a number of its own moves, deepened one
+# move at a time. Its nodes are cut off by bounds that hold whatever the pawns do: no pawn reaches a goal in fewer
+# moves than the distance with short jumps allowed everywhere, and a pawn that has a route to a goal where no pawn of
+# the opponent can get in its way is sure to reach it. Positions where the pawns can't meet before the race is
+# decided are solved by the bounds alone, the others are searched until the pawns are out of each other's way
+class RaceSolver:
+    def __init__(self, board):
+        self.rows, self.columns = board.rows, board.columns
+        squares = self.rows * self.columns
+        self.bits = [1 << index for index in range(squares)]
+
+        # Goals of each side, the starting squares of the opponent
+        self.goals = (self.squares_mask(board.player_2_start), self.squares_mask(board.player_1_start))
+
+        # Jumps of every square as (target, far) where far is None for diagonal jumps and -1 for straight jumps
+        # without a square two squares away
+        steps = [set(board.jump_indices(index)) for index in range(squares)]
+        self.jumps = [self.square_jumps(index, steps) for index in range(squares)]
+
+        # Squares every square reaches with one move if short jumps were allowed anywhere, and the squares a pawn
+        # reaches whatever the other pawns do, where short jumps only go onto the goals
+        relaxed = [[target for target, far in jumps] + [far for _, far in jumps if far is not None and far >= 0]
+                   for jumps in self.jumps]
+        self.routes = tuple([self.route_mask(jumps, goals) for jumps in self.jumps] for goals in self.goals)
+
+        # Lower bounds of the moves from every square to the goals of each side and the squares within every
+        # number of moves of the goals and of every square
+        self.distances = tuple(self.distance_field(relaxed, goals) for goals in self.goals)
+        self.within = tuple(self.distance_masks(distances) for distances in self.distances)
+        self.balls = [self.distance_masks(self.distance_field(relaxed, self.bits[index])) for index in range(squares)]
+
+        # Fewest moves known to win and most moves known not to win for the side to move of the positions
+        self.outcomes = {}
+        self.nodes = 0
+
+    def squares_mask(self, squares):
+        return sum(self.bits[row * self.columns + column] for row, column in squares)
+
+    def square_jumps(self, index, steps):
+        row, column = divmod(index, self.columns)
+        jumps = []
+
+        for row_step, column_step in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+            target = (row + row_step) * self.columns + column + column_step
+            if 0 <= row + row_step < self.rows and 0 <= column + column_step < self.columns and target in steps[index]:
+                jumps.append((target, None))
+
+        for row_step, column_step in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            target = (row + row_step) * self.columns + column + column_step
+            if 0 <= row + row_step < self.rows and 0 <= column + column_step < self.columns and target in steps[index]:
+                far = (row + 2 * row_step) * self.columns + column + 2 * column_step
+                far_open = 0 <= row + 2 * row_step < self.rows and 0 <= column + 2 * column_step < self.columns and \
+                    far in steps[target]
+                jumps.append((target, far if far_open else -1))
+
+        return tuple(jumps)
+
+    def route_mask(self, jumps, goals):
+        mask = 0
+        for target, far in jumps:
+            if far is None or self.bits[target] & goals:
+                mask |= self.bits[target]
+            if far is not None and far >= 0:
+                mask |= self.bits[far]
+
+        return mask
+
+    # Breadth-first search from the squares of the mask over the jumps, unreachable squares are at distance inf
+    def distance_field(self, relaxed, mask):
+        field = [inf] * len(relaxed)
+        frontier = [index for index in range(len(relaxed)) if self.bits[index] & mask]
+        for index in frontier:
+            field[index] = 0
+
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier = []
+            for index in frontier:
+                for target in relaxed[index]:
+                    if field[target] == inf:
+                        field[target] = distance
+                        next_frontier.append(target)
+            frontier = next_frontier
+
+        return field
+
+    # Masks of the squares within every distance, the last one holds all reachable squares
+    def distance_masks(self, field):
+        masks = [0] * (max((distance for distance in field if distance < inf), default=0) + 1)
+        for index, distance in enumerate(field):
+            if distance < inf:
+                masks[distance] |= self.bits[index]
+
+        for distance in range(1, len(masks)):
+            masks[distance] |= masks[distance - 1]
+
+        return masks
+
+    @staticmethod
+    def mask_at(masks, distance):
+        return masks[min(distance, len(masks) - 1)]
+
+    # Fewest moves the side needs to reach a goal with any of its pawns
+    def lower_bound(self, side, pawns):
+        distances = self.distances[side]
+        return min(distances[pawns[0]], distances[pawns[1]])
+
+    # Moves the side surely reaches a goal in, counting only routes of one pawn that the pawns of the opponent can't
+    # get in the way of while the other pawn stays. The opponent moves first unless the side does. Returns inf when
+    # there's no such route within the limit
+    def guaranteed_moves(self, side, pawns, opponent_pawns, first, limit):
+        goals, routes, within = self.goals[side], self.routes[side], self.within[side]
+        balls = [self.balls[pawn] for pawn in opponent_pawns]
+        best = inf
+
+        for pawn, other in ((pawns[0], pawns[1]), (pawns[1], pawns[0])):
+            frontier = self.bits[pawn]
+            step = 0
+            while frontier and step < min(limit, best - 1):
+                step += 1
+                reachable = 0
+                while frontier:
+                    bit = frontier & -frontier
+                    frontier ^= bit
+                    reachable |= routes[bit.bit_length() - 1]
+
+                if reachable & goals:
+                    best = step
+                    break
+
+                # Squares a pawn of the opponent may stand on by then and squares too far from the goals
+                opponent_moves = step - 1 if first else step
+                blocked = self.bits[other]
+                for ball in balls:
+                    blocked |= self.mask_at(ball, opponent_moves)
+                frontier = reachable & ~blocked & self.mask_at(within, min(limit, best - 1) - step)
+
+        return best
+
+    # Pawn moves of the side as (pawn index, target), the same as the legal jumps of the board
+    def pawn_moves(self, side, pawns, opponent_pawns):
+        bits, goals = self.bits, self.goals[side]
+        occupied = bits[pawns[0]] | bits[pawns[1]] | bits[opponent_pawns[0]] | bits[opponent_pawns[1]]
+        # Pawns can land on empty squares and on the goals
+        blocked = occupied & ~goals
+
+        moves = []
+        for pawn_index, pawn in enumerate(pawns):
+            for target, far in self.jumps[pawn]:
+                if far is None:
+                    if not blocked & bits[target]:
+                        moves.append((pawn_index, target))
+                    continue
+
+                # Short jump, only onto the goals or up to a pawn
+                if goals & bits[target] or (not occupied & bits[target] and far >= 0 and occupied & bits[far]):
+                    moves.append((pawn_index, target))
+
+                # Long jump
+                if far >= 0 and not blocked & bits[far]:
+                    moves.append((pawn_index, far))
+
+        return moves
+
+    @staticmethod
+    def moved(pawns, move):
+        pawn_index, target = move
+        return (target, pawns[1]) if pawn_index == 0 else (pawns[0], target)
+
+    # Whether the side to move reaches a goal within the number of its own moves whatever the opponent does
+    def wins(self, side, pawns, opponent_pawns, moves):
+        self.nodes += 1
+        if self.nodes > MAX_RACE_NODES:
+            raise RaceSolverLimit()
+
+        goals = self.goals[side]
+        pawn_moves = self.pawn_moves(side, pawns, opponent_pawns)
+        if any(self.bits[target] & goals for _, target in pawn_moves):
+            return True
+        if moves <= 1 or not pawn_moves:
+            return False
+
+        lower = self.lower_bound(side, pawns)
+        if lower > moves:
+            return False
+
+        opponent = 1 - side
+        limit = min(moves, self.lower_bound(opponent, opponent_pawns))
+        if self.guaranteed_moves(side, pawns, opponent_pawns, True, limit) <= limit:
+            return True
+        if self.guaranteed_moves(opponent, opponent_pawns, pawns, False, lower - 1) < lower:
+            return False
+
+        # The outcome doesn't depend on which pawn is which
+        key = side, min(pawns), max(pawns), min(opponent_pawns), max(opponent_pawns)
+        won, lost = self.outcomes.get(key, (inf, 0))
+        if moves >= won or moves <= lost:
+            return moves >= won
+
+        distances = self.distances[side]
+        pawn_moves.sort(key=lambda move: distances[move[1]])
+        result = any(self.forces_win(side, pawns, opponent_pawns, move, moves) for move in pawn_moves)
+
+        won, lost = self.outcomes.get(key, (inf, 0))
+        self.outcomes[key] = (min(won, moves), lost) if result else (won, max(lost, moves))
+        return result
+
+    # Whether the move leaves the side to move winning within the number of its moves after every reply
+    def forces_win(self, side, pawns, opponent_pawns, move, moves):
+        pawns = self.moved(pawns, move)
+        if self.lower_bound(side, pawns) > moves - 1:
+            return False
+
+        opponent = 1 - side
+        goals = self.goals[opponent]
+        replies = self.pawn_moves(opponent, opponent_pawns, pawns)
+        # Without replies the game is a draw
+        if not replies or any(self.bits[target] & goals for _, target in replies):
+            return False
+
+        distances = self.distances[opponent]
+        replies.sort(key=lambda reply: distances[reply[1]])
+        return all(self.wins(side, pawns, self.moved(opponent_pawns, reply), moves - 1) for reply in replies)
+
+    # Returns the evaluation of the race for the first player (inf or -inf), the best move of the side to move and
+    # the number of its moves until the race ends, or None if the race isn't solved within the nodes. A won race is
+    # won in the fewest moves and a lost one lost in the most
+    def solve(self, board):
+        side = 0 if board.side_to_move == 'X' else 1
+        pawns, opponent_pawns = (board.player_1_pawns, board.player_2_pawns)[::1 if side == 0 else -1]
+        pawns = tuple(row * self.columns + column for row, column in pawns)
+        opponent_pawns = tuple(row * self.columns + column for row, column in opponent_pawns)
+
+        pawn_moves = self.pawn_moves(side, pawns, opponent_pawns)
+        if not pawn_moves:
+            return None
+        distances = self.distances[side]
+        pawn_moves.sort(key=lambda move: distances[move[1]])
+
+        self.nodes = 0
+        # Moves after which the opponent isn't known to win yet
+        defended = list(pawn_moves)
+        try:
+            for moves in range(1, self.rows * self.columns + 1):
+                for move in pawn_moves:
+                    if self.bits[move[1]] & self.goals[side] or \
+                            self.forces_win(side, pawns, opponent_pawns, move, moves):
+                        return (inf if side == 0 else -inf), self.board_move(board, move), moves
+
+                still_defended = [move for move in defended
+                                  if not self.wins(1 - side, opponent_pawns, self.moved(pawns, move), moves)]
+                if not still_defended:
+                    return (-inf if side == 0 else inf), self.board_move(board, defended[0]), moves
+                defended = still_defended
+        except RaceSolverLimit:
+            pass
+
+        return None
+
+    def board_move(self, board, move):
+        pawn_index, target = move
+        return (board.side_to_move, pawn_index, *divmod(target, self.columns)),
+
+
+# Returns the race solver of the walls on the board
+def race_solver(board):
+    key = (board.rows, board.columns, *map(tuple, board.player_1_start), *map(tuple, board.player_2_start),
+           *sorted(board.placed_walls()))
+
+    if key not in race_solvers:
+        race_solvers.clear()
+        race_solvers[key] = RaceSolver(board)
+
+    return race_solvers[key]
+
+
+# Whether neither player has walls left
+def is_race(board):
+    return not any(map(any, board.walls_left.values()))
@@ -0,0 +1,667 @@
+from functools import partial
+from heapq import heappop, heappush
+from itertools import chain
+from math import inf, nextafter
+from time import time
+
+from blocking import BlockingWalls
+from instrumentation import SearchStats
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND
+
+# Deepest iteration of a search limited by time
+MAX_SEARCH_DEPTH = 64
+
+
+# Raised inside the search when its deadline passes or it is stopped
+class SearchTimeout(Exception):
+    pass
+
+
+# Killer moves kept for every depth
+KILLER_MOVES = 2
+
+# Steps in the rank of a pawn move weigh as much as this many steps in the rank of a wall when the combinations of
+# both are ordered. There are a few pawn moves but hundreds of wall slots, so the best pawn moves are combined with
+# more walls before the worse pawn moves come
+PAWN_MOVE_RANK = 4
+
+
+# Settings of the player that every search task gets along. Principal variation search ("pvs") searches every move
+# after the first one of a node with a null window, which only tells if the move is better than the best one so far,
+# and searches it again with the full window only if it is. Its iterations after the first start with an aspiration
+# window of the given width around the last evaluation. Plain alpha-beta ("alphabeta") always uses the full window
+#
+# Every legal move is searched, the order of the moves only decides how deep. The moves after the first
+# full_depth_moves of a node are searched late_move_reduction plies shallower at first. In the nodes off the
+# principal variation with at most late_move_pruning_depth plies left they are pruned when the static evaluation
+# after them is worse than the bound by more than late_move_margin per ply left below them, so they can't change
+# the result of the node. With null_move a node whose side to move would still fail high after passing the turn, in
+# a search null_move_reduction plies shallower, is cut off without searching its moves
+class SearchOptions:
+    def __init__(self, instrumented=False, algorithm="alphabeta", aspiration_window=0.25, full_depth_moves=4,
+                 late_move_reduction=2, late_move_pruning_depth=2, late_move_margin=0.25, null_move=True,
+                 null_move_reduction=2):
+        self.instrumented = instrumented
+        self.algorithm = algorithm
+        self.aspiration_window = aspiration_window
+        self.full_depth_moves = full_depth_moves
+        self.late_move_reduction = late_move_reduction
+        self.late_move_pruning_depth = late_move_pruning_depth
+        self.late_move_margin = late_move_margin
+        self.null_move = null_move
+        self.null_move_reduction = null_move_reduction
+
+
+# Move ordering learned from the cutoffs of a search. The searchers of the root split keep it from one root move to
+# the next, the same as one search of all the root moves does
+class MoveOrdering:
+    def __init__(self):
+        # Last moves that caused a cutoff at every depth left, which often cut off their siblings too
+        self.killers = {}
+        # Scores of the pawn moves and the walls that caused cutoffs for each side, weighted by the depth left.
+        # Moves are combinations of both, so a wall that refutes one pawn move is tried early with the others
+        self.history = {'X': {}, 'O': {}}
+
+
+# Everything a search needs besides the position: the transposition table, the deadline, the function that returns
+# True once the search should stop early, the stats when instrumented, the options and the move ordering. The side
+# to move and the walls left are part of the board, so searches of separate boards share nothing but the table and
+# can run in threads
+class SearchContext:
+    def __init__(self, table, deadline=None, stop=None, stats=None, options=None, ordering=None):
+        self.table = table
+        self.deadline = deadline
+        self.stop = stop
+        self.stats = stats
+        self.options = options or SearchOptions()
+        self.null_windows = self.options.algorithm == "pvs"
+        # False in the node right after a pass, so the turn is never passed twice in a row. Every node resets it
+        # before searching its moves, so the turn may be passed again after a real move
+        self.null_move_allowed = True
+        ordering = ordering or MoveOrdering()
+        self.killers = ordering.killers
+        self.history = ordering.history
+
+    # Remembers the move that caused a cutoff at the depth
+    def store_cutoff(self, move, player, depth):
+        killers = self.killers.setdefault(depth, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLER_MOVES:]
+
+        history = self.history[player]
+        for part in move:
+            history[part] = history.get(part, 0) + depth * depth
+
+
+# Yields the board after every legal move, the move is unmade when the next board state is requested
+def iter_next_legal_board_states(board, moves=None):
+    for move in legal_board_moves(board) if moves is None else moves:
+        board.make_move(move)
+        yield board
+        board.unmake_move()
+
+
+# Moves of the side to move, with a wall for every pawn move while the player has walls left. The moves are ordered
+# by the ranks of their pawn moves and walls, so the combinations of the best pawn moves and walls come first
+def legal_board_moves(board, stats=None):
+    if stats is not None:
+        return stats.timed("move generation", instrumented_legal_board_moves, board, stats)
+
+    vertical_walls, horizontal_walls = board.walls_left[board.side_to_move]
+    if vertical_walls > 0 or horizontal_walls > 0:
+        return legal_pawn_wall_move_combinations(board, legal_pawn_moves(board), legal_wall_placements(board))
+    else:
+        return tuple(map(lambda move: (move,), legal_pawn_moves(board)))
+
+
+# Same as legal_board_moves with every step timed
+def instrumented_legal_board_moves(board, stats):
+    vertical_walls, horizontal_walls = board.walls_left[board.side_to_move]
+    if vertical_walls > 0 or horizontal_walls > 0:
+        pawn_moves = stats.timed("pawn moves", legal_pawn_moves, board)
+        wall_moves = stats.timed("wall moves", legal_wall_placements, board)
+        return stats.timed("blocking walls", legal_pawn_wall_move_combinations, board, pawn_moves, wall_moves, stats)
+    else:
+        return tuple(map(lambda move: (move,), stats.timed("pawn moves", legal_pawn_moves, board)))
+
+
+# Pawn moves sorted by the static evaluation after them, best first
+def legal_pawn_moves(board):
+    return tuple(pawn_move for _, pawn_move in evaluated_pawn_moves(board))
+
+
+# Pawn moves with the static evaluations after them, best first
+def evaluated_pawn_moves(board):
+    player = board.side_to_move
+    pawns = board.player_1_pawns if player == 'X' else board.player_2_pawns
+    pawn_moves = tuple(chain(
+        map(lambda l: (player, 0, *l), board.iter_legal_jumps(player, pawns[0][0], pawns[0][1])),
+        map(lambda l: (player, 1, *l), board.iter_legal_jumps(player, pawns[1][0], pawns[1][1]))
+    ))
+
+    # Sort pawn moves by static evaluation
+    static_evaluations = [0] * len(pawn_moves)
+    for i, pawn_move in enumerate(pawn_moves):
+        undo_move = board.move_pawn(*pawn_move)
+
+        static_evaluations[i] = board.static_evaluation()
+
+        board.move_pawn(*undo_move)
+
+    return sorted(zip(static_evaluations, pawn_moves), reverse=player == 'X')
+
+
+# Wall moves adjacent to starting square or closest enemy pawns come first
+def legal_wall_placements(board):
+    vertical_walls, horizontal_walls = board.walls_left[board.side_to_move]
+    wall_types = ('Z' if vertical_walls > 0 else '') + ('P' if horizontal_walls > 0 else '')
+
+    starting = board.player_1_start if board.side_to_move == 'X' else board.player_2_start
+    overlapping_walls = board.overlapping_walls
+    return [wall for wall, slot in board.wall_slots.order(starting)
+            if not overlapping_walls[slot] and wall[0] in wall_types]
+
+
+# Find all move combinations that don't block any one of the pawns' path to the goal
+def legal_pawn_wall_move_combinations(board, pawn_moves, wall_moves, stats=None):
+    # The walls that can block a path depend only on the walls on the board, so they are found once for all
+    # of the pawn moves
+    blocking_walls = BlockingWalls(board)
+    moves = [move for move in iter_move_combinations(pawn_moves, wall_moves)
+             if not blocking_walls.is_blocking(move[1], move[0])]
+
+    # Walls that close a loop of barriers need their regions flooded, all others are skipped
+    if stats is not None:
+        flooded = sum(1 for regions in blocking_walls.split_regions.values() if regions)
+        stats.count("path checks", flooded)
+        stats.count("path checks skipped", len(blocking_walls.split_regions) - flooded)
+
+    return moves
+
+
+# Yields the moves of the side to move in the order they are searched: the given first moves, the killer moves of the
+# depth and then the other moves by their history scores. Only the pawn moves and the free wall slots are generated
+# up front, whether a wall blocks a path is checked once its move is about to be searched, so a node that is cut
+# off by its first move checks one wall instead of every combination of pawn move and wall
+def iter_ordered_moves(board, depth, context, first_moves=()):
+    stats = context.stats
+    player = board.side_to_move
+    history = context.history[player]
+
+    vertical_walls, horizontal_walls = board.walls_left[player]
+    if vertical_walls > 0 or horizontal_walls > 0:
+        if stats is None:
+            pawn_moves = legal_pawn_moves(board)
+            wall_moves = legal_wall_placements(board)
+        else:
+            pawn_moves = stats.timed("pawn moves", legal_pawn_moves, board)
+            wall_moves = stats.timed("wall moves", legal_wall_placements, board)
+
+        blocking_walls = BlockingWalls(board)
+        if stats is None:
+            is_blocking = blocking_walls.is_blocking
+        else:
+            is_blocking = partial(instrumented_is_blocking, blocking_walls, stats)
+
+        moves = filter(lambda move: not is_blocking(move[1], move[0]),
+                       iter_move_combinations(pawn_moves, wall_moves, history))
+        is_legal = lambda move: len(move) == 2 and move[0] in pawn_moves and move[1] in wall_moves and \
+            not is_blocking(move[1], move[0])
+    else:
+        pawn_moves = legal_pawn_moves(board) if stats is None else stats.timed("pawn moves", legal_pawn_moves, board)
+        moves = sorted(((pawn_move,) for pawn_move in pawn_moves), key=lambda move: -history.get(move[0], 0))
+        is_legal = moves.__contains__
+
+    # Moves from elsewhere in the tree are checked on their own, and skipped once they come up again
+    searched = []
+    for move in chain(first_moves, reversed(context.killers.get(depth, ()))):
+        if move is not None and move not in searched and is_legal(move):
+            searched.append(move)
+            yield move
+
+    for move in moves:
+        if move not in searched:
+            yield move
+
+
+# Yields the combinations of the pawn moves and the walls by the sum of their history scores, combinations with the
+# same score by the weighted sum of the ranks of the pawn move and the wall. A combination of a low-ranked pawn move
+# and wall comes late. The pawn moves and the walls are sorted on their own and merged through a heap, so only the
+# combinations that are searched are ever built
+def iter_move_combinations(pawn_moves, wall_moves, history=None):
+    if not pawn_moves or not wall_moves:
+        return
+
+    history = history or {}
+    pawns = sorted((-history.get(move, 0), rank * PAWN_MOVE_RANK, move) for rank, move in enumerate(pawn_moves))
+    walls = sorted((-history.get(wall, 0), rank, wall) for rank, wall in enumerate(wall_moves))
+
+    # Every combination is pushed by the one before it in the order of the walls, the first combinations of the
+    # pawn moves by the first combination of the pawn move before
+    heap = [(pawns[0][0] + walls[0][0], pawns[0][1] + walls[0][1], 0, 0)]
+    while heap:
+        *_, pawn, wall = heappop(heap)
+        if wall == 0 and pawn + 1 < len(pawns):
+            heappush(heap, (pawns[pawn + 1][0] + walls[0][0], pawns[pawn + 1][1] + walls[0][1], pawn + 1, 0))
+        if wall + 1 < len(walls):
+            heappush(heap, (pawns[pawn][0] + walls[wall + 1][0], pawns[pawn][1] + walls[wall + 1][1], pawn, wall + 1))
+
+        yield pawns[pawn][2], walls[wall][2]
+
+
+# Same as BlockingWalls.is_blocking with the check timed, walls are counted as path checks the first time they are
+# checked if their regions are flooded
+def instrumented_is_blocking(blocking_walls, stats, wall, pawn_move):
+    checked = wall in blocking_walls.split_regions
+    blocking = stats.timed("blocking walls", blocking_walls.is_blocking, wall, pawn_move)
+
+    stats.count("wall checks")
+    if not checked:
+        stats.count("path checks" if blocking_walls.split_regions[wall] else "path checks skipped")
+
+    return blocking
+
+
+# Bounds of the evaluations of the late moves of a node: the static evaluation after the move with the margin in
+# favour of the side to move. The distance evaluation doesn't depend on the walls, so all moves with the same pawn
+# move share the bound of the pawn move and the best pawn move bounds every move of the node
+class LateMovePruning:
+    def __init__(self, board, margin):
+        self.board = board
+        self.margin = margin if board.side_to_move == 'X' else -margin
+        # Bounds of the pawn moves and the best of them, set up for the first late move
+        self.pawn_bounds = None
+        self.best_pawn_bound = None
+
+    def bound(self, move):
+        board = self.board
+        if board.path_evaluation:
+            board.make_move(move)
+            evaluation = board.static_evaluation()
+            board.unmake_move()
+            return evaluation + self.margin
+
+        self.evaluate_pawn_moves()
+        return self.pawn_bounds[move[0]]
+
+    # Bound of every move of the node or None if the moves have bounds of their own
+    def best_bound(self):
+        if self.board.path_evaluation:
+            return None
+
+        self.evaluate_pawn_moves()
+        return self.best_pawn_bound
+
+    def evaluate_pawn_moves(self):
+        if self.pawn_bounds is None:
+            pawn_moves = evaluated_pawn_moves(self.board)
+            self.pawn_bounds = {pawn_move: evaluation + self.margin for evaluation, pawn_move in pawn_moves}
+            self.best_pawn_bound = pawn_moves[0][0] + self.margin
+
+
+# Alpha-beta search that raises SearchTimeout once the deadline passes or the search is stopped, leaving the board
+# unchanged. The moves of the principal variation are searched first
+def minimax(board, depth, alpha, beta, context, principal_variation=()):
+    stats = context.stats
+    if stats is not None:
+        stats.count("nodes")
+
+    if depth == 0 or board.game_end():
+        return board.static_evaluation() if stats is None else stats.timed("evaluation", board.static_evaluation)
+
+    if context.deadline is not None and time() > context.deadline or \
+            context.stop is not None and context.stop():
+        raise SearchTimeout()
+
+    # Use the results of an earlier search of the same position
+    table = context.table
+    hash_move = None
+    entry = table.probe(board.hash_key)
+    if entry is not None:
+        evaluation, entry_depth, bound, hash_move = entry
+
+        if entry_depth >= depth:
+            if bound == EXACT:
+                return evaluation
+            elif bound == LOWER_BOUND:
+                alpha = max(alpha, evaluation)
+            else:
+                beta = min(beta, evaluation)
+
+            if beta <= alpha:
+                return evaluation
+    original_alpha, original_beta = alpha, beta
+
+    # Null move pruning: when passing the turn still fails high for the side to move in a shallower search, one of
+    # its moves will too. Races are left out since every tempo counts in them, and so is the node after a pass
+    options = context.options
+    maximizing = board.side_to_move == 'X'
+    null_move_allowed, context.null_move_allowed = context.null_move_allowed, True
+    if options.null_move and null_move_allowed and depth > options.null_move_reduction + 1 and \
+            any(map(any, board.walls_left.values())):
+        if maximizing and beta != inf and board.static_evaluation() >= beta or \
+                not maximizing and alpha != -inf and board.static_evaluation() <= alpha:
+            evaluation = null_move_minimax(board, depth - 1 - options.null_move_reduction, alpha, beta, maximizing,
+                                           context)
+            if maximizing and evaluation >= beta or not maximizing and evaluation <= alpha:
+                if stats is not None:
+                    stats.count("null move cutoffs")
+                return evaluation
+
+    # Search the move of the principal variation first followed by the best move found earlier
+    pv_move = principal_variation[0] if principal_variation else None
+    moves = iter_ordered_moves(board, depth, context, (pv_move, hash_move))
+
+    best_move = None
+    # Late moves are pruned by their static evaluation off the principal variation close to the leaves
+    late_moves = LateMovePruning(board, options.late_move_margin * (depth - 1)) \
+        if not principal_variation and depth <= options.late_move_pruning_depth else None
+
+    if maximizing:
+        best_eval = -inf
+        for moves_searched, move in enumerate(moves, 1):
+            # Once no late move can raise alpha the rest of them are pruned
+            if late_moves is not None and moves_searched > options.full_depth_moves:
+                bound = late_moves.best_bound()
+                if bound is not None and bound <= alpha:
+                    best_eval = max(best_eval, bound)
+                    if stats is not None:
+                        stats.count("late move cutoffs")
+                    break
+
+                bound = late_moves.bound(move)
+                if bound <= alpha:
+                    best_eval = max(best_eval, bound)
+                    if stats is not None:
+                        stats.count("late move prunings")
+                    continue
+
+            board.make_move(move)
+            try:
+                if moves_searched == 1:
+                    evaluation = minimax(board, depth - 1, alpha, beta, context,
+                                         principal_variation[1:] if move == pv_move else ())
+                else:
+                    evaluation = search_later_move(board, depth - 1, alpha, beta, True, context,
+                                                   late_move_reduction(options, depth, moves_searched),
+                                                   principal_variation[1:] if move == pv_move else ())
+            finally:
+                board.unmake_move()
+
+            if evaluation > best_eval or best_move is None:
+                best_eval, best_move = evaluation, move
+
+            # Alpha cut off
+            alpha = max(alpha, evaluation)
+            if beta <= alpha:
+                break
+    else:
+        best_eval = inf
+        for moves_searched, move in enumerate(moves, 1):
+            # Once no late move can lower beta the rest of them are pruned
+            if late_moves is not None and moves_searched > options.full_depth_moves:
+                bound = late_moves.best_bound()
+                if bound is not None and bound >= beta:
+                    best_eval = min(best_eval, bound)
+                    if stats is not None:
+                        stats.count("late move cutoffs")
+                    break
+
+                bound = late_moves.bound(move)
+                if bound >= beta:
+                    best_eval = min(best_eval, bound)
+                    if stats is not None:
+                        stats.count("late move prunings")
+                    continue
+
+            board.make_move(move)
+            try:
+                if moves_searched == 1:
+                    evaluation = minimax(board, depth - 1, alpha, beta, context,
+                                         principal_variation[1:] if move == pv_move else ())
+                else:
+                    evaluation = search_later_move(board, depth - 1, alpha, beta, False, context,
+                                                   late_move_reduction(options, depth, moves_searched),
+                                                   principal_variation[1:] if move == pv_move else ())
+            finally:
+                board.unmake_move()
+
+            if evaluation < best_eval or best_move is None:
+                best_eval, best_move = evaluation, move
+
+            # Beta cut off
+            beta = min(beta, evaluation)
+            if beta <= alpha:
+                break
+
+    # The loop was cut off by the last searched move
+    if beta <= alpha:
+        context.store_cutoff(move, board.side_to_move, depth)
+
+        if stats is not None:
+            stats.count("cutoffs")
+            if moves_searched == 1:
+                stats.count("first move cutoffs")
+
+    # No legal moves is a draw
+    if best_move is None:
+        best_eval = 0
+
+    if best_eval <= original_alpha:
+        bound = UPPER_BOUND
+    elif best_eval >= original_beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    table.store(board.hash_key, depth, bound, best_eval, best_move)
+
+    return best_eval
+
+
+# Number of plies the move is reduced by when it comes late in a node of the depth
+def late_move_reduction(options, depth, moves_searched):
+    if moves_searched > options.full_depth_moves and depth - 1 > options.late_move_reduction:
+        return options.late_move_reduction
+    return 0
+
+
+# Searches the position after a move that isn't the first one of its node to the depth. A late move is searched to
+# the reduced depth first, and to the full depth only if it turns out better than the best move so far
+def search_later_move(board, depth, alpha, beta, maximizing, context, reduction=0, principal_variation=()):
+    if reduction:
+        if context.null_windows:
+            reduced_alpha, reduced_beta = (alpha, nextafter(alpha, inf)) if maximizing else \
+                (nextafter(beta, -inf), beta)
+        else:
+            reduced_alpha, reduced_beta = alpha, beta
+
+        evaluation = minimax(board, depth - reduction, reduced_alpha, reduced_beta, context, principal_variation)
+        if maximizing and evaluation <= alpha or not maximizing and evaluation >= beta:
+            return evaluation
+
+        if context.stats is not None:
+            context.stats.count("reduction re-searches")
+
+    if context.null_windows:
+        return null_window_minimax(board, depth, alpha, beta, maximizing, context, principal_variation)
+    return minimax(board, depth, alpha, beta, context, principal_variation)
+
+
+# Passes the turn and searches the position to the depth with a null window at beta of a maximizing node or at
+# alpha of a minimizing one
+def null_move_minimax(board, depth, alpha, beta, maximizing, context):
+    board.skip_turn()
+    context.null_move_allowed = False
+    try:
+        if maximizing:
+            return minimax(board, depth, nextafter(beta, -inf), beta, context)
+        else:
+            return minimax(board, depth, alpha, nextafter(alpha, inf), context)
+    finally:
+        context.null_move_allowed = True
+        board.skip_turn()
+
+
+# Searches the position after a move of principal variation search that isn't the first move of its node. The null
+# window above alpha of a maximizing node or below beta of a minimizing one only tells if the move is better than the
+# best move so far, only then is it searched again with the full window
+def null_window_minimax(board, depth, alpha, beta, maximizing, context, principal_variation=()):
+    if maximizing:
+        evaluation = minimax(board, depth, alpha, nextafter(alpha, inf), context, principal_variation)
+    else:
+        evaluation = minimax(board, depth, nextafter(beta, -inf), beta, context, principal_variation)
+
+    if alpha < evaluation < beta:
+        if context.stats is not None:
+            context.stats.count("re-searches")
+        evaluation = minimax(board, depth, alpha, beta, context, principal_variation)
+
+    return evaluation
+
+
+# Follows the best moves stored in the transposition table from the position
+def stored_principal_variation(board, depth, table):
+    moves = []
+
+    while len(moves) < depth and not board.game_end():
+        move = table.best_move(board.hash_key)
+        if move is None:
+            break
+
+        moves.append(move)
+        board.make_move(move)
+
+    for _ in moves:
+        board.unmake_move()
+
+    return tuple(moves)
+
+
+# Alpha-beta search of the root moves in the given order within the window. Returns the evaluation, the best move
+# and the principal variation after it. An evaluation outside the window is only a bound of the real one
+def search_root(board, moves, depth, context, alpha=-inf, beta=inf):
+    maximizing = board.side_to_move == 'X'
+    best_evaluation, best_move = None, None
+
+    for moves_searched, move in enumerate(moves, 1):
+        board.make_move(move)
+        try:
+            if moves_searched == 1:
+                evaluation = minimax(board, depth - 1, alpha, beta, context)
+            else:
+                evaluation = search_later_move(board, depth - 1, alpha, beta, maximizing, context,
+                                               late_move_reduction(context.options, depth, moves_searched))
+        finally:
+            board.unmake_move()
+
+        if maximizing:
+            if best_move is None or evaluation > best_evaluation:
+                best_evaluation, best_move = evaluation, move
+            alpha = max(alpha, evaluation)
+        else:
+            if best_move is None or evaluation < best_evaluation:
+                best_evaluation, best_move = evaluation, move
+            beta = min(beta, evaluation)
+
+        if beta <= alpha:
+            break
+
+    board.make_move(best_move)
+    try:
+        principal_variation = stored_principal_variation(board, depth - 1, context.table)
+    finally:
+        board.unmake_move()
+
+    return best_evaluation, best_move, principal_variation
+
+
+# Searches the root moves within the aspiration window around the evaluation of the last iteration. When the
+# evaluation falls outside the window the search is repeated with the window open on that side
+def aspiration_search(board, moves, depth, context, evaluation):
+    width = context.options.aspiration_window
+    alpha, beta = evaluation - width, evaluation + width
+
+    while True:
+        search = search_root(board, moves, depth, context, alpha, beta)
+        if search[0] <= alpha and alpha != -inf:
+            alpha = -inf
+        elif search[0] >= beta and beta != inf:
+            beta = inf
+        else:
+            return search
+
+        if context.stats is not None:
+            context.stats.count("aspiration re-searches")
+
+
+# Changes in the counters of the table since the given ones
+def table_changes(table, start_stats):
+    return {name: value - start_stats[name] for name, value in table.stats().items()}
+
+
+# Plays the root move and searches the position after it to the depth below the root within the window. Returns the
+# evaluation, the principal variation after the move, the changes in the counters of the table and the search stats
+# if instrumented. The move ordering of an earlier root move of the same position is carried on
+def search_move(board, move, depth, table, deadline=None, principal_variation=(), options=None, stop=None,
+                window=(-inf, inf), ordering=None):
+    start_stats = table.stats()
+    options = options or SearchOptions()
+    stats = SearchStats() if options.instrumented else None
+
+    board.make_move(move)
+
+    # The board is kept by the engine, so it is restored even when the search runs out of time
+    try:
+        evaluation = minimax(board, depth, *window, SearchContext(table, deadline, stop, stats, options, ordering),
+                             principal_variation)
+        principal_variation = stored_principal_variation(board, depth, table)
+    finally:
+        board.unmake_move()
+
+    return evaluation, principal_variation, table_changes(table, start_stats), \
+        {} if stats is None else stats.as_dict()
+
+
+# Iterative deepening over all root moves, run by every helper of the parallel search. Helpers start at different
+# depths and with different root moves, so they fill the shared table with different parts of the tree for each
+# other. Only the first helper always completes the first iteration. Returns the deepest completed depth, its
+# evaluation, best move and principal variation, the changes in the counters of the table and the search stats
+def search_tree(board, moves, helper, depth, table, deadline=None, options=None, stop=None):
+    start_stats = table.stats()
+    options = options or SearchOptions()
+    stats = SearchStats() if options.instrumented else None
+
+    moves = moves[helper % len(moves):] + moves[:helper % len(moves)]
+    search = 0, None, moves[0], ()
+
+    # The killer moves and history scores are kept from one iteration to the next
+    context = SearchContext(table, None, stop, stats, options)
+    for iteration in range(1 + helper % 2, depth + 1):
+        context.deadline = deadline if helper or iteration > 1 else None
+        try:
+            if context.null_windows and search[1] is not None:
+                search = iteration, *aspiration_search(board, moves, iteration, context, search[1])
+            else:
+                search = iteration, *search_root(board, moves, iteration, context)
+        except SearchTimeout:
+            break
+
+        # The best move is searched first in the next iteration
+        best_move = search[2]
+        moves = [best_move, *(move for move in moves if move != best_move)]
+
+        if abs(search[1]) == inf:
+            break
+
+    return (*search, table_changes(table, start_stats), {} if stats is None else stats.as_dict())
+
+
+# Searches the position for the side to move with iterative deepening, using nothing but the board and the table.
+# Returns the completed depth, the evaluation, the best move and the principal variation after it
+def search(board, depth, table, deadline=None, options=None):
+    moves = legal_board_moves(board)
+    if not moves:
+        return 0, None, None, ()
+
+    return search_tree(board, moves, 0, depth, table, deadline, options)[:4]
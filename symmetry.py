@@ -0,0 +1,104 @@
+from zobrist import zobrist_keys
+
+# Symmetries of every board setup, which depend only on the geometry and the starting squares
+symmetries_cache = {}
+
+# A symmetry is (mirror_rows, swap_sides). Mirroring the rows flips the board top to bottom, swapping the sides
+# mirrors the columns and exchanges the pawns, walls left and turn of the two players. Every symmetry is its own
+# inverse and the first one is the identity
+SYMMETRIES = ((False, False), (True, False), (False, True), (True, True))
+
+
+# Symmetries of a board setup that map the starting squares of each player onto the starting squares of the player
+# it becomes. Pawns are renumbered to the index of the starting square they are mapped to, so a position and its
+# mirror image are the same positions a game reaches with the mirrored moves
+class Symmetries:
+    def __init__(self, rows, columns, player_1_start, player_2_start):
+        self.rows = rows
+        self.columns = columns
+        self.zobrist = zobrist_keys(rows, columns)
+
+        starts = {'X': tuple(map(tuple, player_1_start)), 'O': tuple(map(tuple, player_2_start))}
+        # Pawn indices of every player under every symmetry
+        self.pawn_indices = {}
+        for symmetry in SYMMETRIES:
+            indices = {}
+            for player in 'XO':
+                mirrored = [self.square(symmetry, *start) for start in starts[player]]
+                if sorted(mirrored) != sorted(starts[self.player(symmetry, player)]):
+                    break
+                indices[player] = tuple(starts[self.player(symmetry, player)].index(square) for square in mirrored)
+            else:
+                self.pawn_indices[symmetry] = indices
+
+    # Symmetries of the setup, always starting with the identity
+    def symmetries(self):
+        return tuple(self.pawn_indices)
+
+    @staticmethod
+    def player(symmetry, player):
+        return ('O' if player == 'X' else 'X') if symmetry[1] else player
+
+    def square(self, symmetry, row, column):
+        mirror_rows, swap_sides = symmetry
+        return self.rows - 1 - row if mirror_rows else row, self.columns - 1 - column if swap_sides else column
+
+    # Walls sit between two rows or columns and span two squares, so a mirrored wall starts one square earlier
+    def wall(self, symmetry, wall_type, row, column):
+        mirror_rows, swap_sides = symmetry
+        return wall_type, self.rows - 2 - row if mirror_rows else row, \
+            self.columns - 2 - column if swap_sides else column
+
+    # Returns the move under the symmetry, mapping a move of the canonical position back works the same way
+    def move(self, symmetry, move):
+        if move is None:
+            return None
+
+        (player, pawn_index, row, column), *wall = move
+        pawn_move = self.player(symmetry, player), self.pawn_indices[symmetry][player][pawn_index], \
+            *self.square(symmetry, row, column)
+        if not wall:
+            return pawn_move,
+
+        return pawn_move, self.wall(symmetry, *wall[0])
+
+    # Hash of the position under the symmetry. Unlike the hash of the board it doesn't depend on who placed the
+    # walls, the walls left to the players are hashed instead
+    def position_key(self, symmetry, board, walls):
+        zobrist, columns = self.zobrist, self.columns
+        key = zobrist.side if self.player(symmetry, board.side_to_move) == 'O' else 0
+
+        for player, pawns in (('X', board.player_1_pawns), ('O', board.player_2_pawns)):
+            mirrored_player = self.player(symmetry, player)
+            for pawn_index, (row, column) in enumerate(pawns):
+                mirrored_row, mirrored_column = self.square(symmetry, row, column)
+                key ^= zobrist.pawns[mirrored_player][self.pawn_indices[symmetry][player][pawn_index]][
+                    mirrored_row * columns + mirrored_column]
+
+            for wall_type, walls_left in zip('ZP', board.walls_left[player]):
+                key ^= zobrist.walls_left[mirrored_player][wall_type][walls_left]
+
+        for wall in walls:
+            wall_type, row, column = self.wall(symmetry, *wall)
+            key ^= zobrist.walls[None][wall_type][row * columns + column]
+
+        return key
+
+    # Returns the key of the canonical form of the position, the least key of its symmetric images, and the
+    # symmetry that maps the position to it. Moves of the canonical position are mapped back with the same symmetry
+    def canonical_key(self, board):
+        walls = board.placed_walls()
+        return min((self.position_key(symmetry, board, walls), symmetry) for symmetry in self.pawn_indices)
+
+
+def symmetries(board):
+    key = (board.rows, board.columns, *map(tuple, board.player_1_start), *map(tuple, board.player_2_start))
+    if key not in symmetries_cache:
+        symmetries_cache[key] = Symmetries(board.rows, board.columns, board.player_1_start, board.player_2_start)
+
+    return symmetries_cache[key]
+
+
+# Key of the canonical form of the position on the board and the symmetry that maps the position to it
+def canonical_key(board):
+    return symmetries(board).canonical_key(board)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import argparse
+import configparser
+import multiprocessing
+import random
+import signal
+from functools import partial
+from itertools import cycle
+from timeit import default_timer
+
+from main import *
+from search import legal_board_moves
+from transposition import transposition_tables
+
+# Random opening moves are picked out of this many moves first in the move order
+OPENING_CHOICES = 16
+
+
+# Engine settings of one side of the tournament. They are read like the ENGINE section of the config, starting
+# from the ENGINE section of "config.ini" with the given "key=value" options on top
+class EngineSettings:
+    def __init__(self, name, options):
+        self.name = name
+        self.board_class = BitBoard
+        self.table_size_mb = 32
+        self.move_time = 0
+        self.search_depth = 3
+        self.path_evaluation = False
+        self.instrumented = False
+        self.ponder = False
+        self.parallel = "root"
+        self.processes = 0
+        self.workers = "processes"
+        self.search_algorithm = "alphabeta"
+        self.aspiration_window = 0.25
+        self.full_depth_moves = 4
+        self.late_move_reduction = 2
+        self.late_move_pruning_depth = 2
+        self.late_move_margin = 0.25
+        self.null_move = True
+        self.null_move_reduction = 2
+        self.race_solver = True
+        # Read like the rest of the section, but games of a tournament never use the analysis cache or the book
+        self.analysis_cache_path = ""
+        self.analysis_cache_entries = 0
+        self.opening_book_path = ""
+
+        config = configparser.ConfigParser()
+        config.read("config.ini")
+        section = dict(config["ENGINE"]) if config.has_section("ENGINE") else {}
+        section.update(option.split("=", 1) for option in options)
+        config.read_dict({"ENGINE": section})
+        read_engine_config(self, config["ENGINE"])
+
+    def configure(self, player):
+        player.profiling = False
+        player.table_size_mb = self.table_size_mb
+        player.table_name = self.name
+        player.move_time = self.move_time
+        player.search_depth = self.search_depth
+        player.instrumented = self.instrumented
+        player.parallel = self.parallel
+        player.search_algorithm = self.search_algorithm
+        player.aspiration_window = self.aspiration_window
+        player.full_depth_moves = self.full_depth_moves
+        player.late_move_reduction = self.late_move_reduction
+        player.late_move_pruning_depth = self.late_move_pruning_depth
+        player.late_move_margin = self.late_move_margin
+        player.null_move = self.null_move
+        player.null_move_reduction = self.null_move_reduction
+        player.race_solver = self.race_solver
+
+    def __str__(self):
+        return (f"{self.name}: depth {self.search_depth}, move time {self.move_time}, "
+                f"evaluation {'path' if self.path_evaluation else 'distance'}, search {self.search_algorithm}, "
+                f"tt {self.table_size_mb} MB")
+
+
+# Game between two computer players without any input or output. The searches run in the process of the game,
+# so games can be played in parallel by the processes of a pool
+class TournamentGame:
+    def __init__(self, setup, player_1_settings, player_2_settings, seed, opening_moves, max_moves):
+        rows, columns, walls, player_1_pawns, player_2_pawns, board_class = setup
+        self.board = board_class(rows, columns, player_1_pawns, player_2_pawns, walls)
+        self.player_1 = Computer('X', self)
+        self.player_2 = Computer('O', self)
+        self.settings = {self.player_1: player_1_settings, self.player_2: player_2_settings}
+        for player, settings in self.settings.items():
+            settings.configure(player)
+        self.engine = SerialEngine()
+        # Every game starts from scratch, so the results don't depend on the games played before
+        self.analysis_cache = None
+        self.opening_book = None
+
+        self.random = random.Random(seed)
+        self.opening_moves = opening_moves
+        self.max_moves = max_moves
+
+    # Returns the winner ('X', 'O' or None for a draw), the number of moves and the time spent searching by the
+    # player of each side and the number of searched moves
+    def run(self):
+        # Games don't use what was searched in earlier games of the same process
+        for table in transposition_tables.values():
+            table.clear()
+
+        player_cycle = cycle((self.player_1, self.player_2))
+        current_player = None
+        moves = 0
+        search_times = {'X': 0.0, 'O': 0.0}
+        searches = {'X': 0, 'O': 0}
+
+        while not self.board.game_end():
+            if moves == self.max_moves:
+                return None, moves, search_times, searches
+
+            current_player = next(player_cycle)
+            moves += 1
+
+            # The evaluation mode belongs to the board, so it is switched to the one of the player to move
+            path_evaluation = self.settings[current_player].path_evaluation
+            if self.board.path_evaluation != path_evaluation:
+                self.board.path_evaluation = path_evaluation
+                self.board.evaluation = None
+
+            # Openings are random moves out of the best ones by the move order
+            if moves <= self.opening_moves:
+                legal_moves = legal_board_moves(self.board)[:OPENING_CHOICES]
+                move = self.random.choice(legal_moves) if legal_moves else None
+            else:
+                start = default_timer()
+                move = current_player.get_move(self.board)
+                search_times[current_player.player] += default_timer() - start
+                searches[current_player.player] += 1
+
+            if move is None:
+                return None, moves, search_times, searches
+            self.board.make_move(move)
+
+        return current_player.player, moves, search_times, searches
+
+
+# Interrupts are handled by the main process which terminates the pool
+def init_tournament_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# Plays the game with the index. Both sides play every opening once with each color, the first settings play with
+# 'X' in even games
+def play_game(setup, first, second, seed, opening_moves, max_moves, index):
+    swapped = index % 2 == 1
+    game = TournamentGame(setup, *((second, first) if swapped else (first, second)), seed + index // 2,
+                          opening_moves, max_moves)
+    winner, moves, search_times, searches = game.run()
+
+    first_color, second_color = ('O', 'X') if swapped else ('X', 'O')
+    return (None if winner is None else winner == first_color), moves, \
+        (search_times[first_color], searches[first_color]), (search_times[second_color], searches[second_color])
+
+
+def run_tournament(games, first_options, second_options, seed=0, opening_moves=4, max_moves=200, processes=None):
+    game = Game()
+    game.read_config()
+    setup = (game.rows, game.columns, game.walls, game.player_1_pawns, game.player_2_pawns, game.board_class)
+    first = EngineSettings("first", first_options)
+    second = EngineSettings("second", second_options)
+
+    print(f"Board: {game.rows}x{game.columns}, walls: {game.walls}, games: {games}, seed: {seed}")
+    print(first)
+    print(second)
+
+    wins = draws = losses = total_moves = 0
+    search_times = [[0.0, 0], [0.0, 0]]
+
+    start = default_timer()
+    with multiprocessing.Pool(processes, initializer=init_tournament_worker) as pool:
+        results = pool.imap_unordered(
+            partial(play_game, setup, first, second, seed, opening_moves, max_moves), range(games))
+
+        for result, moves, *side_times in results:
+            if result is None:
+                draws += 1
+            elif result:
+                wins += 1
+            else:
+                losses += 1
+            total_moves += moves
+
+            for totals, (search_time, searches) in zip(search_times, side_times):
+                totals[0] += search_time
+                totals[1] += searches
+    elapsed = default_timer() - start
+
+    print(f"Played {games} games in {elapsed:.1f} s ({games / elapsed:.2f} games/s), "
+          f"average length {total_moves / games:.1f} moves")
+    print(f"First: {wins} wins, {draws} draws, {losses} losses, score {(wins + draws / 2) / games:.3f}")
+    for settings, (search_time, searches) in zip((first, second), search_times):
+        print(f"Average move time of {settings.name}: {search_time / max(searches, 1) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays games between two engine settings in parallel")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--first", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="ENGINE options of the first side, like search_depth=2 or evaluation=path")
+    parser.add_argument("--second", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="ENGINE options of the second side")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random openings")
+    parser.add_argument("--opening-moves", type=int, default=4, help="Number of random moves at the start")
+    parser.add_argument("--max-moves", type=int, default=200, help="Number of moves after which a game is a draw")
+    parser.add_argument("--processes", type=int, default=None, help="Number of games played at once")
+    arguments = parser.parse_args()
+
+    run_tournament(arguments.games, arguments.first, arguments.second, arguments.seed, arguments.opening_moves,
+                   arguments.max_moves, arguments.processes)
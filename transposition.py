@@ -0,0 +1,202 @@
+import struct
+from array import array
+from multiprocessing import shared_memory
+
+from codec import encode_move, decode_move
+
+# Bound types of the stored evaluations, 0 marks an empty slot
+EXACT = 1
+LOWER_BOUND = 2
+UPPER_BOUND = 3
+
+# Bytes used by one entry: key, evaluation, move, depth and bound
+ENTRY_SIZE = 8 + 8 + 4 + 1 + 1
+
+# Words of an entry of the shared table: the key XOR-ed with the other two words, the bits of the evaluation and the
+# move, depth and bound packed by pack_entry
+SHARED_ENTRY_SIZE = 3 * 8
+DOUBLE = struct.Struct('<d')
+WORD = struct.Struct('<Q')
+
+# Tables are per process and outlive the players and boards that use them. Players that evaluate positions
+# differently, like the two sides of a tournament, keep separate tables by name
+transposition_tables = {}
+
+
+# Fixed-size hash table of searched positions. Every bucket has two slots, the first one keeps the entry searched
+# to the greatest depth and the second one is always replaced. Entries are kept in flat arrays so the memory used
+# is fixed by the size given in megabytes
+class TranspositionTable:
+    def __init__(self, size_mb):
+        self.size_mb = size_mb
+        self.num_buckets = max(1, int(size_mb * 2 ** 20) // (2 * ENTRY_SIZE))
+
+        num_slots = 2 * self.num_buckets
+        self.keys = array('Q', [0]) * num_slots
+        self.evaluations = array('d', [0.0]) * num_slots
+        self.moves = array('I', [0]) * num_slots
+        self.depths = array('b', [0]) * num_slots
+        self.bounds = array('B', [0]) * num_slots
+
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    # Returns the evaluation, depth, bound type and best move stored for the key or None if there is no entry
+    def probe(self, key):
+        slot = key % self.num_buckets * 2
+
+        for index in (slot, slot + 1):
+            if self.bounds[index] and self.keys[index] == key:
+                self.hits += 1
+                return self.evaluations[index], self.depths[index], self.bounds[index], decode_move(self.moves[index])
+
+        # A miss on a bucket occupied by other positions
+        self.misses += 1
+        if self.bounds[slot] or self.bounds[slot + 1]:
+            self.collisions += 1
+        return None
+
+    # Returns the best move stored for the key without counting the lookup
+    def best_move(self, key):
+        slot = key % self.num_buckets * 2
+
+        for index in (slot, slot + 1):
+            if self.bounds[index] and self.keys[index] == key:
+                return decode_move(self.moves[index])
+
+        return None
+
+    def store(self, key, depth, bound, evaluation, move):
+        slot = key % self.num_buckets * 2
+
+        # Use the depth-preferred slot if it holds the same position, a shallower search or nothing
+        if self.keys[slot] != key and self.bounds[slot] and self.depths[slot] > depth:
+            slot += 1
+
+        self.keys[slot] = key
+        self.evaluations[slot] = evaluation
+        self.moves[slot] = encode_move(move)
+        self.depths[slot] = depth
+        self.bounds[slot] = bound
+        self.stores += 1
+
+    def clear(self):
+        for field in (self.keys, self.moves, self.depths, self.bounds):
+            field[:] = array(field.typecode, [0]) * len(field)
+        self.evaluations[:] = array('d', [0.0]) * len(self.evaluations)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "collisions": self.collisions, "stores": self.stores}
+
+
+# Transposition table in shared memory that the engine processes of the parallel search use at the same time.
+# Entries are written without locks, so two processes writing the same slot can leave a torn entry behind. The key
+# is stored XOR-ed with the other words of the entry, so a torn entry fails the key check like an entry of another
+# position. The process that creates the table owns the shared memory, the others attach to it by name
+class SharedTranspositionTable:
+    def __init__(self, size_mb, shared_memory_name=None):
+        self.owner = shared_memory_name is None
+        self.shared_memory = shared_memory.SharedMemory(shared_memory_name, create=self.owner,
+                                                        size=2 * shared_table_buckets(size_mb) * SHARED_ENTRY_SIZE)
+        self.attach(size_mb, self.shared_memory.buf)
+
+    # Lays the words of the entries out in the buffer
+    def attach(self, size_mb, buffer):
+        self.size_mb = size_mb
+        self.num_buckets = shared_table_buckets(size_mb)
+
+        words = 2 * self.num_buckets * WORD.size
+        self.buffer = buffer
+        self.checks = buffer[:words].cast('Q')
+        self.evaluation_bits = buffer[words:2 * words].cast('Q')
+        self.entries = buffer[2 * words:3 * words].cast('Q')
+
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def probe(self, key):
+        slot = key % self.num_buckets * 2
+
+        for index in (slot, slot + 1):
+            entry = self.entries[index]
+            bits = self.evaluation_bits[index]
+            if entry and self.checks[index] ^ entry ^ bits == key:
+                self.hits += 1
+                return DOUBLE.unpack(WORD.pack(bits))[0], entry >> 25 & 255, entry >> 33, \
+                    decode_move(entry & 0x1FFFFFF)
+
+        self.misses += 1
+        if self.entries[slot] or self.entries[slot + 1]:
+            self.collisions += 1
+        return None
+
+    def best_move(self, key):
+        slot = key % self.num_buckets * 2
+
+        for index in (slot, slot + 1):
+            entry = self.entries[index]
+            if entry and self.checks[index] ^ entry ^ self.evaluation_bits[index] == key:
+                return decode_move(entry & 0x1FFFFFF)
+
+        return None
+
+    def store(self, key, depth, bound, evaluation, move):
+        slot = key % self.num_buckets * 2
+
+        entry = self.entries[slot]
+        if entry and self.checks[slot] ^ entry ^ self.evaluation_bits[slot] != key and entry >> 25 & 255 > depth:
+            slot += 1
+
+        entry = pack_entry(depth, bound, move)
+        bits = WORD.unpack(DOUBLE.pack(evaluation))[0]
+        self.entries[slot] = entry
+        self.evaluation_bits[slot] = bits
+        self.checks[slot] = key ^ entry ^ bits
+        self.stores += 1
+
+    def clear(self):
+        self.buffer[:] = bytes(len(self.buffer))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "collisions": self.collisions, "stores": self.stores}
+
+    # Detaches from the shared memory, which is also freed by the owner
+    def close(self):
+        for field in (self.checks, self.evaluation_bits, self.entries):
+            field.release()
+        self.shared_memory.close()
+        if self.owner:
+            self.shared_memory.unlink()
+
+
+# The table of the parallel search kept in a bytearray, for searches in threads of the same process. It leaves no
+# shared memory behind when the engine isn't shut down
+class ThreadTranspositionTable(SharedTranspositionTable):
+    def __init__(self, size_mb):
+        self.attach(size_mb, memoryview(bytearray(2 * shared_table_buckets(size_mb) * SHARED_ENTRY_SIZE)))
+
+    def close(self):
+        for field in (self.checks, self.evaluation_bits, self.entries):
+            field.release()
+        self.buffer.release()
+
+
+# Number of buckets of a shared table of the size in megabytes
+def shared_table_buckets(size_mb):
+    return max(1, int(size_mb * 2 ** 20) // (2 * SHARED_ENTRY_SIZE))
+
+
+def transposition_table(size_mb, name=None):
+    if (name, size_mb) not in transposition_tables:
+        transposition_tables[(name, size_mb)] = TranspositionTable(size_mb)
+
+    return transposition_tables[(name, size_mb)]
+
+
+# Packs the move code (25 bits), the depth (8 bits) and the bound (2 bits) of an entry of the shared table into a word
+def pack_entry(depth, bound, move):
+    return encode_move(move) | depth << 25 | bound << 33
@@ -0,0 +1,44 @@
+import random
+
+# Keys are generated from a fixed seed per geometry so that every process derives the same hash for a position
+zobrist_keys_cache = {}
+
+# Most walls of each type a player can have
+MAX_WALLS = 18
+
+
+class ZobristKeys:
+    def __init__(self, rows, columns):
+        rng = random.Random(rows * 1000 + columns)
+        squares = rows * columns
+
+        # Keys for every square of the first and second pawn of both players
+        self.pawns = {player: [[rng.getrandbits(64) for _ in range(squares)] for _ in range(2)]
+                      for player in ('X', 'O')}
+        # Keys for every wall slot, indexed by the square in the top-left of the wall. A wall has a different key for
+        # every player that can place it, which makes the hash also account for the walls left to each player.
+        # Walls placed without a player (e.g. while testing a placement) use the keys under None
+        self.walls = {player: {wall_type: [rng.getrandbits(64) for _ in range(squares)] for wall_type in ('Z', 'P')}
+                      for player in ('X', 'O', None)}
+        # Toggled after every move
+        self.side = rng.getrandbits(64)
+        # Keys for the number of walls of every type left to each player, used by hashes that don't tell who placed
+        # the walls on the board
+        self.walls_left = {player: {wall_type: [rng.getrandbits(64) for _ in range(MAX_WALLS + 1)]
+                                    for wall_type in ('Z', 'P')}
+                           for player in ('X', 'O')}
+
+    def initial_hash(self, columns, player_1_pawns, player_2_pawns):
+        hash_key = 0
+        for player, pawns in (('X', player_1_pawns), ('O', player_2_pawns)):
+            for pawn_index, pawn in enumerate(pawns):
+                hash_key ^= self.pawns[player][pawn_index][pawn[0] * columns + pawn[1]]
+
+        return hash_key
+
+
+def zobrist_keys(rows, columns):
+    if (rows, columns) not in zobrist_keys_cache:
+        zobrist_keys_cache[(rows, columns)] = ZobristKeys(rows, columns)
+
+    return zobrist_keys_cache[(rows, columns)]